@@ -1,9 +1,13 @@
-CREATE DATABASE budgetapp;
+CREATE DATABASE IF NOT EXISTS budgetapp;
 USE budgetapp;
 
-DROP TABLE IF EXISTS categories;
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS monthly_rollups;
+DROP TABLE IF EXISTS revokedtokens;
+DROP TABLE IF EXISTS refreshtokens;
 DROP TABLE IF EXISTS transactions;
 DROP TABLE IF EXISTS recurringpayments;
+DROP TABLE IF EXISTS categories;
 DROP TABLE IF EXISTS users;
 
 CREATE TABLE users (
@@ -9,6 +9,8 @@ Functions:
 
 import requests
 
+from decimal import Decimal
+
 from client_utils import calculate_remainder, handle_error, valid_date
 from query import find_recurring_payment, find_transaction, query
 from main import get_active_session
@@ -67,7 +69,7 @@ def update_budget_category(baseurl: str):
         handle_error(url, res)
         return
 
-    body = res.json()
+    body = res.json(parse_float=Decimal)
     spent = body["spent"]
 
     print("")
@@ -163,7 +165,7 @@ def helper(baseurl, api, entry):
 
             data = {
                 "updating": "cost",
-                "old-cost": entry[2],
+                "old-cost": float(entry[2]),
                 "new-cost": new_cost,
                 "category": entry[3],
                 "id": entry[0],
@@ -196,7 +198,7 @@ def helper(baseurl, api, entry):
             new_category = existing_categories[category_index]
             data = {
                 "updating": "category",
-                "cost": entry[2],
+                "cost": float(entry[2]),
                 "old-category": entry[3],
                 "new-category": new_category,
                 "id": entry[0],
@@ -15,6 +15,7 @@ Functions:
 import requests
 
 from datetime import datetime
+from decimal import Decimal
 
 
 class User:
@@ -78,14 +79,19 @@ def valid_date(year: str, month: str, day: str):
         return False
 
 
-def calculate_remainder(totalbudget: float, spent: float):
+def calculate_remainder(totalbudget: Decimal, spent: Decimal):
     """Calculates and prints the remaining budget.
 
+    Amounts are converted to Decimal first, so the remainder is exact to the
+    cent even if one of them was typed in as a float.
+
     Args:
-        totalbudget (int): The total budget.
-        spent (int): The amount of the budget that's been spent.
+        totalbudget (Decimal): The total budget.
+        spent (Decimal): The amount of the budget that's been spent.
     """
-    remainder = totalbudget - spent
+    totalbudget = Decimal(str(totalbudget))
+    spent = Decimal(str(spent))
+    remainder = (totalbudget - spent).quantize(Decimal("0.01"))
     percentage = spent / totalbudget * 100
 
     print(f"   Remaining Budget: ${remainder}")
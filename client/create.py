@@ -10,6 +10,8 @@ Functions:
 
 import requests
 
+from decimal import Decimal
+
 from client_utils import calculate_remainder, handle_error, valid_date
 from query import query
 from main import get_active_session, login
@@ -181,7 +183,7 @@ def add_new_transaction(baseurl):
         handle_error(url, res)
         return
 
-    body = res.json()
+    body = res.json(parse_float=Decimal)
     right_of_decimal = str(cost).split(".")[1]
     trailing_zero = "0" * (2 - len(right_of_decimal))
 
@@ -9,11 +9,13 @@ Authors:
 """
 
 import requests
+import base64
 import json
 import pathlib
 import logging
 import sys
 import os
+import time
 
 import alter
 import create
@@ -26,12 +28,46 @@ from configparser import ConfigParser
 SESSIONS = {}
 STATE = "logged out"
 
+#
+# Access tokens this close to expiring, in seconds, are renewed before use.
+#
+REFRESH_MARGIN_SECONDS = 60
 
-def log_out():
-    """Updates the state to `logged out`."""
+
+def log_out(baseurl: str | None = None):
+    """Updates the state to `logged out`.
+
+    Given the base url, the active session's tokens are also revoked on the
+    server and the session is forgotten.
+
+    Args:
+        baseurl (str | None): The base url for the web service. Defaults to None,
+            i.e. only the state changes.
+
+    Returns:
+        None
+    """
     global STATE
     STATE = "logged out"
 
+    username, token = get_active_session()
+    if baseurl is None or username is None:
+        return
+
+    api = "/auth/logout"
+    url = baseurl + api
+    data = {}
+    if SESSIONS[username].get("refresh_token"):
+        data["refresh_token"] = SESSIONS[username]["refresh_token"]
+
+    res = requests.post(url, json=data, headers={"Authorization": "Bearer " + token})  # type: ignore
+
+    if not res.ok:
+        handle_error(url, res)
+
+    del SESSIONS[username]
+    save_sessions()
+
 
 def add_new():
     """Updates the state to `add new`."""
@@ -109,26 +145,95 @@ def use_session(username: str):
     for session in SESSIONS:
         SESSIONS[session]["active"] = False
     SESSIONS[username]["active"] = True
+    save_sessions()
+
+
+def save_sessions():
+    """Saves the sessions to the sessions.json file.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
     with open("sessions.json", "w") as f:
         json.dump(SESSIONS, f, indent=2)
 
 
-def update_session(username: str, token: str):
-    """Updates the session with the given username and token.
+def update_session(username: str, token: str, refresh_token: str | None = None):
+    """Updates the session with the given username and tokens.
 
     Args:
         username (str): The user's username.
         token (str): The user's access_token.
+        refresh_token (str | None): The user's refresh_token, if any.
 
     Returns:
         None
     """
     global SESSIONS
-    SESSIONS[username] = {"token": token, "active": False}
+    SESSIONS[username] = {
+        "token": token,
+        "refresh_token": refresh_token,
+        "active": False,
+    }
 
     use_session(username)
 
 
+def token_expires_soon(token: str):
+    """Checks whether an access token is about to expire.
+
+    The token's expiry is read without verifying its signature; the server
+    still verifies the token on every request.
+
+    Args:
+        token (str): The user's access_token.
+
+    Returns:
+        bool: True if the token expires within REFRESH_MARGIN_SECONDS or cannot
+            be read, otherwise false.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload))["exp"]
+    except Exception:
+        return True
+
+    return exp - time.time() < REFRESH_MARGIN_SECONDS
+
+
+def refresh_session(baseurl: str, username: str):
+    """Renews a session's access token using its refresh token.
+
+    Args:
+        baseurl (str): The base url for the web service.
+        username (str): The user's username.
+
+    Returns:
+        bool: True if the session was renewed, otherwise false.
+    """
+    session = SESSIONS.get(username)
+    if session is None or not session.get("refresh_token"):
+        return False
+
+    api = "/auth/refresh"
+    url = baseurl + api
+    res = requests.post(url, json={"refresh_token": session["refresh_token"]})
+
+    if not res.ok:
+        # Refresh tokens are single-use; a rejected one will never work again.
+        session["refresh_token"] = None
+        save_sessions()
+        return False
+
+    body = res.json()
+    update_session(username, body["access_token"], body["refresh_token"])
+    return True
+
+
 def clear_sessions():
     """Clears all sessions.
 
@@ -140,8 +245,7 @@ def clear_sessions():
     """
     global SESSIONS
     SESSIONS = {}
-    with open("sessions.json", "w") as f:
-        json.dump(SESSIONS, f, indent=2)
+    save_sessions()
 
 
 def reset_everything(baseurl: str):
@@ -181,10 +285,21 @@ def login(baseurl: str, username: str | None = None, password: str | None = None
     Returns:
         None
     """
+    global STATE
+
     if username is None:
         print("Enter username>")
         username = input()
 
+        #
+        # Resume the stored session, if any, without sending the password:
+        #
+        if refresh_session(baseurl, username):
+            print("")
+            print("User logged in, username =", username)
+            STATE = "logged in"
+            return
+
         print("Enter password>")
         password = input()
 
@@ -207,8 +322,7 @@ def login(baseurl: str, username: str | None = None, password: str | None = None
     #
     # Update sessions:
     #
-    update_session(username, token)
-    global STATE
+    update_session(username, token, body.get("refresh_token"))
     STATE = "logged in"
     return
 
@@ -398,6 +512,22 @@ def main():
                 fn = fns[cmd]
                 if fn is None:
                     break
+
+                #
+                # Renew the access token before it expires:
+                #
+                username, token = get_active_session()
+                if (
+                    STATE != "logged out"
+                    and username is not None
+                    and token_expires_soon(token)  # type: ignore
+                    and not refresh_session(baseurl, username)
+                ):
+                    print("** Session expired, please log in again")
+                    log_out()
+                    cmd = prompt()
+                    continue
+
                 fn(baseurl)
                 cmd = prompt()
         except Exception as e:
@@ -15,6 +15,7 @@ Functions:
 import requests
 
 from datetime import datetime
+from decimal import Decimal
 
 from client_utils import calculate_remainder, handle_error, Transaction, User
 from main import get_active_session
@@ -40,7 +41,7 @@ def query(baseurl, type):
         handle_error(url, res)
         return []
 
-    body = res.json()
+    body = res.json(parse_float=Decimal)
     return body["rows"]
 
 
@@ -247,7 +248,8 @@ def find_recurring_payment(baseurl):
 
 
 def overview(baseurl):
-    """Prints a summary of all financial information for the month.
+    """Prints a summary of all financial information for a month, or for a
+    whole year month by month.
 
     Args:
         baseurl (str): The base url for web service.
@@ -266,14 +268,27 @@ def overview(baseurl):
         print("Invalid year")
         return
 
-    print("Enter month you'd like an overview for (DD)>")
-    month = int(input())
-
-    if month < 0 or month > 12:
+    print("Enter month you'd like an overview for (MM), or press ENTER for all>")
+    month = input()
+
+    if month == "":
+        #
+        # The whole year, or the year to date, split by month in one request.
+        #
+        end = min(datetime(year, 12, 31), datetime.now())
+        query = (
+            "?begin="
+            + str(year)
+            + "-01-01&end="
+            + end.strftime("%Y-%m-%d")
+            + "&granularity=month"
+        )
+    elif not month.isnumeric() or int(month) < 1 or int(month) > 12:
         print("Invalid month")
         return
+    else:
+        query = "?year=" + str(year) + "&month=" + month
 
-    query = "?year=" + str(year) + "&month=" + str(month)
     url = url + query
     res = requests.get(url, headers={"Authorization": "Bearer " + token})  # type: ignore
 
@@ -281,7 +296,7 @@ def overview(baseurl):
         handle_error(url, res)
         return
 
-    body = res.json()
+    body = res.json(parse_float=Decimal)
     sum = body["sum"]
     top_3 = body["top_3"]
     begin_range = body["begin_range"]
@@ -293,6 +308,14 @@ def overview(baseurl):
         print("No transactions found for given year and month.")
         return
 
+    if month == "":
+        print("")
+        print(
+            "Here is your spending by month for " + begin_range + " -> " + end_range
+        )
+        for bucket in body["buckets"]:
+            print("   " + bucket["begin_range"][:7] + ": $" + str(bucket["sum"]))
+
     transactions = []
     for row in top_3:
         transaction = Transaction(row)
@@ -51,9 +51,19 @@ def delete_budget_category(baseurl):
         print("You cannot delete this category.")
         return
 
-    if category[1] > 0:
+    #
+    # The server will not delete a category that transactions or recurring
+    # payments still refer to, even if their costs add up to nothing.
+    #
+    in_use = any(
+        row[4] == category[0] for row in query(baseurl, "transactions")
+    ) or any(row[3] == category[0] for row in query(baseurl, "recurringpayments"))
+
+    if in_use:
         print("")
-        print("This category has transactions associated with it.")
+        print(
+            "This category has transactions or recurring payments associated with it."
+        )
         print(
             "What new category should be used for those transactions after this category is deleted?"
         )
@@ -93,7 +103,7 @@ def delete_transaction(baseurl):
     transaction = find_transaction(baseurl)
     data = {
         "id": transaction[0],
-        "trans-cost": transaction[2],
+        "trans-cost": float(transaction[2]),
         "cost-category": transaction[3],
     }
 
@@ -0,0 +1,190 @@
+"""Serves the read-heavy routes as coroutines for the asyncio server.
+
+These share their request parsing and response building with the Lambda
+handlers, and only swap datatier for datatier_async, so a request that is
+waiting on the database costs a coroutine instead of a thread.
+
+Login is CPU-bound rather than I/O-bound, so its bcrypt work runs on a thread
+pool sized to the machine's cores. bcrypt releases the GIL, so those threads
+hash in parallel while the event loop keeps serving other requests.
+
+Token revocation is checked with the blocking datatier when a process's Bloom
+filter is reloaded or reports a possibly revoked token, so runtime.async_handler
+verifies tokens on the event loop's executor and the loop never waits on it.
+
+This file contains the following functions:
+
+    * authenticate - the coroutine version of auth_function.lambda_handler
+    * query - the coroutine version of query_function.lambda_handler
+    * overview - the coroutine version of overview_function.lambda_handler
+"""
+
+import asyncio
+import concurrent.futures
+import os
+
+import auth_function
+import overview_function
+import query_function
+
+from utils import datatier_async, auth, api_utils, runtime, usercache, refresh_tokens
+
+#
+# Runs password hashing off the event loop, one hash per core at most.
+#
+BCRYPT_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="budgetapp-bcrypt"
+)
+
+
+@runtime.async_handler("Authentication", requires_body=True)
+async def authenticate(request: runtime.Request):
+    """Authenticates a user attempting to login to the app.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing an `access_token` and a
+            `refresh_token`, or an error response.
+    """
+    response, username, password = auth_function.read_credentials(request)
+    if response is not None:
+        return response
+
+    print("**Opening connection**")
+    settings = request.rds_settings()
+
+    async with datatier_async.acquire_db_conn(*settings) as db_conn:
+        row = await datatier_async.retrieve_one_row(
+            db_conn, auth_function.LOGIN_SQL, [username]
+        )
+
+    response, userid, new_hash = await asyncio.get_running_loop().run_in_executor(
+        BCRYPT_EXECUTOR, auth_function.check_login, row, password
+    )
+    if response is not None:
+        return response
+
+    refresh_token, parameters = refresh_tokens.new_token(
+        userid, runtime.SECRET, runtime.REFRESH_TOKEN_DAYS
+    )
+
+    async with datatier_async.acquire_db_conn(*settings) as db_conn:
+        if new_hash is not None:
+            try:
+                await datatier_async.perform_action(
+                    db_conn, auth_function.REHASH_SQL, [new_hash, userid, row[1]]
+                )
+            except Exception as err:
+                print("**Rehash failed**")
+                print(str(err))
+
+        await datatier_async.execute_action(
+            db_conn, refresh_tokens.ISSUE_SQL, parameters
+        )
+
+    token = auth.generate_token(userid, runtime.SECRET)
+
+    print("**DONE, returning tokens**")
+    return api_utils.success(
+        200, {"access_token": token, "refresh_token": refresh_token}
+    )
+
+
+@runtime.async_handler("Query", requires_token=True)
+async def query(request: runtime.Request):
+    """Queries information from the database.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing `rows` or an error response.
+    """
+    userid = request.userid
+
+    response, sql = query_function.build_query(request)
+    if response is not None:
+        return response
+
+    print("**Opening connection**")
+    settings = request.rds_settings(read_only=True)
+
+    async with datatier_async.acquire_db_conn(*settings) as db_conn:
+        print("**Checking if userid is valid**")
+        exists = usercache.lookup(userid)
+
+        if exists is None:
+            row = await datatier_async.retrieve_one_row(
+                db_conn, usercache.EXISTS_SQL, [userid]
+            )
+            exists = row != ()
+            usercache.remember(userid, exists)
+
+        if not exists:  # no such user
+            print("**No such user, returning...**")
+            return api_utils.error(404, "no such user")
+
+        rows = await datatier_async.retrieve_all_rows(db_conn, sql, [userid])
+
+        print("**DONE**")
+        return api_utils.success_rows(200, rows)
+
+
+@runtime.async_handler("Overview", requires_token=True)
+async def overview(request: runtime.Request):
+    """Gets an overview of the user's budget.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing `sum`, `categories`, `buckets`,
+            `top`, `top_3`, `granularity`, `begin_range`, and `end_range` or an
+            error response.
+    """
+    userid = request.userid
+
+    response, begin_range, end_range = overview_function.get_range(request)
+    if response is not None:
+        return response
+
+    response, granularity, top = overview_function.get_options(
+        request, begin_range, end_range
+    )
+    if response is not None:
+        return response
+
+    known = usercache.lookup(userid)
+    if known is False:
+        return api_utils.error(404, "no such user")
+
+    print("**Opening connection**")
+    settings = request.rds_settings(read_only=True)
+
+    async with datatier_async.acquire_db_conn(
+        *settings, multi_statements=True
+    ) as db_conn:
+        print("**Checking if userid is valid and summarizing transactions**")
+        results = await datatier_async.retrieve_many(
+            db_conn,
+            overview_function.build_queries(
+                userid, begin_range, end_range, known is None, granularity, top
+            ),
+        )
+
+        return overview_function.build_response(
+            userid, results, begin_range, end_range, granularity
+        )
+
+
+#
+# The routes served natively as coroutines, keyed like router_function.ROUTES.
+# Every other route runs its Lambda handler on a worker thread.
+#
+ROUTES = {
+    "/auth": {"POST": authenticate},
+    "/query/{args}": {"GET": query},
+    "/overview": {"GET": overview},
+}
@@ -0,0 +1,247 @@
+"""Serves the API over HTTP from a single asyncio event loop.
+
+Routes listed in async_routes run as coroutines against datatier_async, so one
+process can keep hundreds of requests in flight while they wait on MySQL. The
+remaining routes run their Lambda handlers on a small thread pool, exactly as
+server.py does.
+
+Run from a directory containing lambda-config.ini:
+
+    python async_server.py --port 8080 --max-in-flight 512 --connections 32
+
+This file contains the following functions:
+
+    * read_request - reads one HTTP/1.1 request from a connection
+    * write_response - writes a handler response to a connection
+    * dispatch - runs an event through the matching coroutine or handler
+    * serve - runs the server until it is interrupted or terminated
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import http
+import json
+import signal
+
+import async_routes
+import router_function
+
+from server import KEEP_ALIVE_TIMEOUT_SECONDS, build_event
+from utils import datatier, datatier_async, api_utils
+
+#
+# How long, in seconds, shutdown waits for in-flight requests to finish.
+#
+SHUTDOWN_TIMEOUT_SECONDS = 30
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Reads one HTTP/1.1 request from a connection.
+
+    Args:
+        reader (asyncio.StreamReader): The connection to read from.
+
+    Returns:
+        tuple[str, str, str, dict, str | None] | None: The method, target, HTTP
+            version, headers and body, or None if the client closed the
+            connection or sat idle past the keep-alive timeout.
+
+    Raises:
+        ValueError: The request is malformed.
+    """
+    try:
+        request_line = await asyncio.wait_for(
+            reader.readline(), KEEP_ALIVE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        return None
+
+    if not request_line.strip():
+        return None
+
+    method, target, version = request_line.decode("latin-1").split()
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip()] = value.strip()
+
+    lengths = [v for k, v in headers.items() if k.lower() == "content-length"]
+    length = int(lengths[0]) if lengths else 0
+    body = (await reader.readexactly(length)).decode("utf-8") if length else None
+
+    return method, target, version, headers, body
+
+
+async def write_response(writer: asyncio.StreamWriter, response: dict, close: bool):
+    """Writes a handler response to a connection.
+
+    Args:
+        writer (asyncio.StreamWriter): The connection to write to.
+        response (dict): The response returned by a handler.
+        close (bool): Whether to tell the client the connection will close.
+    """
+    status = response["statusCode"]
+    payload = (response.get("body") or "").encode("utf-8")
+
+    try:
+        reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    for name, value in (response.get("headers") or {}).items():
+        lines.append(f"{name}: {value}")
+    lines.append("Content-Type: application/json")
+    lines.append(f"Content-Length: {len(payload)}")
+    lines.append("Connection: " + ("close" if close else "keep-alive"))
+
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+async def dispatch(event: dict):
+    """Runs an event through the coroutine or Lambda handler for its route.
+
+    Args:
+        event (dict): A JSON representation of the HTTP request.
+
+    Returns:
+        dict: The handler's response.
+    """
+    route, parameters = router_function.match_route(
+        event.get("resource"), event.get("path")
+    )
+    coroutines = async_routes.ROUTES.get(route, {})
+    method = event.get("httpMethod")
+
+    if method not in coroutines:
+        # Blocking handlers, and the router's own 404 and 405 responses.
+        return await asyncio.to_thread(router_function.lambda_handler, event, None)
+
+    if parameters is not None:
+        event = dict(event, resource=route, pathParameters=parameters)
+
+    return await coroutines[method](event, None)
+
+
+async def serve(host: str, port: int, max_in_flight: int, connections: int):
+    """Runs the server until it receives SIGINT or SIGTERM.
+
+    On shutdown, the server stops accepting connections, gives in-flight
+    requests up to SHUTDOWN_TIMEOUT_SECONDS to finish, and closes the pooled
+    database connections.
+
+    Args:
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        max_in_flight (int): The most requests handled at once; others wait.
+        connections (int): The most database connections each pool may open.
+    """
+    loop = asyncio.get_running_loop()
+
+    # Blocking handlers get one thread, and one pooled connection, each.
+    threads = min(connections, 32)
+    loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="budgetapp-worker"
+        )
+    )
+    datatier.resize_pools(threads)
+    datatier_async.resize_pools(connections)
+
+    in_flight = asyncio.Semaphore(max_in_flight)
+    clients = set()
+
+    async def handle_client(reader, writer):
+        clients.add(asyncio.current_task())
+
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await write_response(
+                        writer, api_utils.error(400, "malformed request"), True
+                    )
+                    break
+
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                connection = next(
+                    (v for k, v in headers.items() if k.lower() == "connection"), ""
+                ).lower()
+                close = connection == "close" or (
+                    version == "HTTP/1.0" and connection != "keep-alive"
+                )
+
+                event = build_event(method, target, headers, body)
+
+                async with in_flight:
+                    try:
+                        response = await dispatch(event)
+                    except Exception as err:
+                        print("**ERROR**")
+                        print(str(err))
+                        response = {
+                            "statusCode": 500,
+                            "body": json.dumps({"message": str(err)}),
+                        }
+
+                await write_response(writer, response, close)
+                print(f"**HTTP** \"{method} {target}\" {response['statusCode']}")
+
+                if close:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            clients.discard(asyncio.current_task())
+            writer.close()
+
+    server = await asyncio.start_server(handle_client, host, port)
+
+    stopping = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    print(f"**Serving on {host}:{port} with {max_in_flight} requests in flight**")
+
+    async with server:
+        await stopping.wait()
+
+        print("**Shutting down**")
+        server.close()
+
+        if clients:
+            _, pending = await asyncio.wait(
+                set(clients), timeout=SHUTDOWN_TIMEOUT_SECONDS
+            )
+            for task in pending:
+                task.cancel()
+
+    await datatier_async.close_pools()
+    datatier.close_pools()
+    print("**DONE**")
+
+
+def main():
+    """Parses the command line and runs the server."""
+    parser = argparse.ArgumentParser(description="Serve the budget app API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--connections", type=int, default=32)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.max_in_flight, args.connections))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,108 +3,130 @@
 This authenticates a user attempting to login.
 """
 
-import json
-import os
+from utils import datatier, auth, api_utils, runtime, refresh_tokens
+
+#
+# Login needs only the user's ID and password hash, fetched in one query.
+#
+LOGIN_SQL = """
+SELECT userid, pwdhash
+FROM users
+WHERE username = %s;
+"""
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
+#
+# Replaces a hash with one of the configured cost. The update is skipped if the
+# hash changed in the meantime.
+#
+REHASH_SQL = """
+UPDATE users
+SET pwdhash = %s
+WHERE userid = %s
+AND pwdhash = %s;
+"""
 
 
-def lambda_handler(event, context):
-    """Authenticates a user attempting to login to the app.
+def read_credentials(request: runtime.Request):
+    """Reads the username and password from the request body.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
-        dict: The success response containing an `access_token` or an error response.
+        tuple[dict | None, str | None, str | None]: An error response, or None and
+            the username and password.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Authentication**")
+    body = request.body
 
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
+    if "username" not in body or "password" not in body:
+        return api_utils.error(400, "missing credentials in body"), None, None
 
-        configur = ConfigParser()
-        configur.read(config_file)
+    return None, body["username"], body["password"]
 
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
 
-        #
-        # Read the username and password from the event body.
-        #
-        print("**Accessing request body**")
+def check_login(row: tuple, password: str):
+    """Checks a password against the user row from LOGIN_SQL.
 
-        if "body" not in event:
-            return api_utils.error(400, "no body in request")
+    This is CPU-bound: it runs bcrypt once, or twice if the stored hash must be
+    brought up to the configured cost. An unknown user costs the same as a
+    wrong password and gets the same response.
 
-        body = json.loads(event["body"])
+    Args:
+        row (tuple): The (userid, pwdhash) row, or () if there is no such user.
+        password (str): The password given by the client.
 
-        if "username" not in body or "password" not in body:
-            return api_utils.error(400, "missing credentials in body")
+    Returns:
+        tuple[dict | None, int | None, str | None]: An error response, or None,
+            the user's ID, and a new hash to store if the old one needs
+            replacing.
+    """
+    pwdhash = row[1] if row != () else None
 
-        username = body["username"]
-        password = body["password"]
+    if not auth.check_password(password, pwdhash):
+        return api_utils.error(401, "invalid username or password"), None, None
 
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
+    new_hash = None
+    if auth.needs_rehash(pwdhash):
+        print("**Rehashing password**")
+        new_hash = auth.hash_password(password)
 
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
+    return None, row[0], new_hash
 
-        sql = """
-        SELECT *
-        FROM users
-        WHERE username = %s;
-        """
-        row = datatier.retrieve_one_row(db_conn, sql, [username])
-        if row == ():
-            return api_utils.error(404, "no such user")
-
-        sql = """
-        SELECT pwdhash
-        FROM users
-        WHERE username = %s;
-        """
-        pwdhash = datatier.retrieve_one_row(db_conn, sql, [username])[0]
-        if not auth.check_password(password, pwdhash):
-            return api_utils.error(401, "password incorrect")
-
-        sql = """
-        SELECT userid
-        FROM users
-        WHERE username = %s;
-        """
-        row = datatier.retrieve_one_row(db_conn, sql, [username])
-        userid = row[0]
-        token = auth.generate_token(userid, secret)
+
+@runtime.handler("Authentication", requires_body=True)
+def lambda_handler(request: runtime.Request):
+    """Authenticates a user attempting to login to the app.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing an `access_token` and a
+            `refresh_token`, or an error response.
+    """
+    #
+    # Read the username and password from the event body.
+    #
+    response, username, password = read_credentials(request)
+    if response is not None:
+        return response
+
+    #
+    # Open connection to the database. It goes back to the pool before bcrypt
+    # runs, so a burst of logins does not hold every connection.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
+        row = datatier.retrieve_one_row(db_conn, LOGIN_SQL, [username])
+
+    response, userid, new_hash = check_login(row, password)
+    if response is not None:
+        return response
+
+    with request.db_conn() as db_conn:
+        if new_hash is not None:
+            try:
+                datatier.perform_action(db_conn, REHASH_SQL, [new_hash, userid, row[1]])
+            except Exception as err:
+                # The login itself succeeded; try again next time.
+                print("**Rehash failed**")
+                print(str(err))
 
         #
-        # Respond in an HTTP-like way, i.e. with a status
-        # code and body in JSON format.
+        # Start a new refresh token family, so the client can renew its access
+        # token without logging in again.
         #
-        print("**DONE, returning token**")
-        return api_utils.success(200, {"access_token": token})
+        refresh_token = refresh_tokens.issue(
+            db_conn, userid, runtime.SECRET, runtime.REFRESH_TOKEN_DAYS
+        )
 
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
+    token = auth.generate_token(userid, runtime.SECRET)
 
-        return api_utils.error(500, str(err))
+    #
+    # Respond in an HTTP-like way, i.e. with a status
+    # code and body in JSON format.
+    #
+    print("**DONE, returning tokens**")
+    return api_utils.success(
+        200, {"access_token": token, "refresh_token": refresh_token}
+    )
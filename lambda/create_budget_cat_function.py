@@ -3,92 +3,51 @@
 This creates a specified budget category for the user.
 """
 
-import json
-import os
+from utils import datatier, api_utils, runtime, usercache, money, spending
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
 
-
-def lambda_handler(event, context):
+@runtime.handler("Create Budget Category", requires_body=True, requires_token=True)
+def lambda_handler(request: runtime.Request):
     """Creates a new budget category for the current user.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing an `access_token` or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Create Budget Category**")
-
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
-
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
-
-        #
-        # Read the name and budget from the event body.
-        #
-        print("**Accessing request body**")
-
-        if "body" not in event:
-            return api_utils.error(400, "no body in request")
+    #
+    # Read the name and budget from the event body.
+    #
+    body = request.body
 
-        body = json.loads(event["body"])
+    if "name" not in body or "budget" not in body:
+        return api_utils.error(400, "missing name or budget")
 
-        if "name" not in body or "budget" not in body:
-            return api_utils.error(400, "missing name or budget")
-
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
-
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
+    userid = request.userid
+    name = body["name"]
+    budget = body["budget"]
 
+    # A category without a budget, such as Uncategorized, has a null budget.
+    if budget is not None:
         try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
-
-        name = body["name"]
-        budget = body["budget"]
-
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
-
+            budget = money.parse(budget)
+        except ValueError as err:
+            return api_utils.error(400, "invalid budget: " + str(err))
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
         print("**Checking if userid is valid**")
-        sql = "SELECT * FROM users WHERE userid = %s;"
-        row = datatier.retrieve_one_row(db_conn, sql, [userid])
-
-        if row == ():  # no such user
+        if not usercache.user_exists(db_conn, userid):
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
+        if spending.find_category(db_conn, userid, name) != ():
+            return api_utils.error(409, "category already exists")
+
         sql = """
         INSERT INTO categories (category, userid, totalbudget, spent)
         VALUES (%s, %s, %s, %s)
@@ -101,10 +60,4 @@ def lambda_handler(event, context):
         # code and body in JSON format.
         #
         print("**DONE, returning token**")
-        return api_utils.success(200, {"access_token": token})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
+        return api_utils.success(200, {"access_token": request.token})
@@ -3,180 +3,140 @@
 This deletes a category, transaction, or recurring payment.
 """
 
-import json
-import os
+from utils import datatier, api_utils, runtime, spending, usercache
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
 
-
-def lambda_handler(event, context):
+@runtime.handler("Delete", requires_body=True, requires_token=True)
+def lambda_handler(request: runtime.Request):
     """Deletes a specified category, transaction, or recurring payment.
 
+    A category can only be deleted once nothing refers to it, unless a
+    `new-category` is given to move its transactions and recurring payments to.
+
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing an `id` or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Delete**")
-
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
-
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
-
-        #
-        # Read the token from the event body.
-        #
-        print("**Accessing request headers**")
-
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
-
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
-
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
+    #
+    # Find out what's being deleted.
+    #
+    userid = request.userid
+    body = request.body
+    table = request.path_parameters["args"]
+    column = ""
+    delete = ""
+    update = ""
+
+    if "category" in body:
+        delete = body["category"]
+        column = "category"
+    elif "new-category" in body:
+        delete = body["old-category"]
+        update = body["new-category"]
+        column = "category"
+    elif "cost-category" in body:
+        delete = body["id"]
 
-        try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
-
-        #
-        # Find out what's being deleted.
-        #
-        if "body" not in event:
-            return api_utils.error(400, "no body in request")
-
-        body = json.loads(event["body"])
-        table = event["pathParameters"]["args"]
-        column = ""
-        delete = ""
-        update = ""
-        trans_cost = 0
-
-        if "category" in body:
-            delete = body["category"]
-            column = "category"
-        elif "new-category" in body:
-            delete = body["old-category"]
-            update = body["new-category"]
-            column = "category"
-        elif "cost-category" in body:
-            update = body["cost-category"]
-            delete = body["id"]
-
-            if "trans-cost" in body:
-                column = "transactionid"
-                trans_cost = body["trans-cost"]
-            else:
-                column = "paymentid"
+        if "trans-cost" in body:
+            column = "transactionid"
         else:
-            return api_utils.error(400, "unspecified delete request")
-
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
-
-        print("**Checking if userid is valid and getting current spent**")
+            column = "paymentid"
+    else:
+        return api_utils.error(400, "unspecified delete request")
+
+    # The table name is spliced into the DELETE below, so only known tables
+    # may get that far.
+    if table not in ["categories", "transactions", "recurringpayments"]:
+        return api_utils.error(400, "invalid delete type")
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
+        print("**Checking if userid is valid**")
         row = ""
         row2 = ""
 
         if "new-category" in body:
-            sql1 = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
-            """
-            sql2 = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
-            """
-            row = datatier.retrieve_one_row(db_conn, sql1, [userid, delete])
-            row2 = datatier.retrieve_one_row(db_conn, sql2, [userid, update])
-        elif "trans-cost" in body:
+            row, row2 = spending.find_categories(db_conn, userid, [delete, update])
+        elif column == "category":
+            #
+            # A category still referred to cannot be deleted on its own.
+            #
             sql = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
+            SELECT c.categoryid,
+                EXISTS(SELECT 1 FROM transactions AS t
+                    WHERE t.categoryid = c.categoryid)
+                OR EXISTS(SELECT 1 FROM recurringpayments AS r
+                    WHERE r.categoryid = c.categoryid)
+            FROM categories AS c
+            WHERE c.userid = %s
+            AND c.category = %s
             """
-            row = datatier.retrieve_one_row(db_conn, sql, [userid, update])
-        else:
-            sql = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            """
-            row = datatier.retrieve_one_row(db_conn, sql, [userid])
+            row = datatier.retrieve_one_row(db_conn, sql, [userid, delete])
+
+            if row != () and row[1]:
+                return api_utils.error(
+                    409, "category still has transactions or recurring payments"
+                )
+        elif not usercache.user_exists(db_conn, userid):
+            row = ()
 
         if row == ():  # no such user
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
+        if "new-category" in body and row2 == ():
+            return api_utils.error(404, "no such category")
+
         #
         # Delete
         #
         query_1 = """
         DELETE FROM """ + table + """
-        WHERE """ + column + """ = %s;
+        WHERE """ + column + """ = %s
+        AND userid = %s;
         """
 
-        datatier.perform_action(db_conn, query_1, [delete])
-
-        if "new-category" in body:
-            new_cat_spent = row2[0] + row[0]
-
-            query_2 = """
-            UPDATE categories
-            SET spent = %s
-            WHERE category = %s;
-            """
-            query_3 = """
-            UPDATE transactions
-            SET category = %s
-            WHERE category = %s
-            AND userid = %s;
-            """
-            datatier.perform_action(db_conn, query_2, [new_cat_spent, update])
-            datatier.perform_action(db_conn, query_3, [update, delete, userid])
-        if "trans-cost" in body:
-            updated_spent = row[0] - trans_cost
-
-            query_4 = """
-            UPDATE categories
-            SET spent = %s
-            WHERE category = %s;
-            """
-            datatier.perform_action(db_conn, query_4, [updated_spent, update])
+        with datatier.transaction(db_conn):
+            if "new-category" in body:
+                #
+                # Move the old category's spent and everything that refers to
+                # it first, so that it can be deleted.
+                #
+                spending.merge(db_conn, userid, row[0], row2[0])
+
+                query_2 = """
+                UPDATE transactions
+                SET categoryid = %s
+                WHERE categoryid = %s;
+                """
+                query_3 = """
+                UPDATE recurringpayments
+                SET categoryid = %s
+                WHERE categoryid = %s;
+                """
+                datatier.execute_action(db_conn, query_2, [row2[0], row[0]])
+                datatier.execute_action(db_conn, query_3, [row2[0], row[0]])
+
+            #
+            # A transaction's stored cost comes out of its category's spent and
+            # monthly rollup.
+            #
+            current = ()
+            if column == "transactionid":
+                current = spending.lock_transaction(db_conn, userid, delete)
+
+                if current == ():
+                    return api_utils.error(404, "no such transaction")
+
+            datatier.execute_action(db_conn, query_1, [delete, userid])
+
+            if current != ():
+                spending.apply(db_conn, userid, removed=[current])
 
         #
         # Respond in an HTTP-like way, i.e. with a status
@@ -184,9 +144,3 @@ def lambda_handler(event, context):
         #
         print("**DONE**")
         return api_utils.success(200, {"id": userid})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
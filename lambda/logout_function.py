@@ -0,0 +1,51 @@
+"""Handles the event that a `POST: /auth/logout` request is received.
+
+This revokes the caller's access token and, if one is given, the family of its
+refresh token, so neither can be used again.
+"""
+
+from utils import datatier, auth, api_utils, runtime, refresh_tokens, revocation
+
+
+@runtime.handler("Logout", requires_token=True)
+def lambda_handler(request: runtime.Request):
+    """Logs a user out of the app.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request. The body may hold a
+            `refresh_token` to revoke as well.
+
+    Returns:
+        dict: The success response containing success or an error response.
+    """
+    userid = request.userid
+    claims = auth.get_claims(request.token, runtime.SECRET)
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
+        with datatier.transaction(db_conn):
+            #
+            # Tokens issued before token IDs existed cannot be revoked; they
+            # simply expire.
+            #
+            if "jti" in claims:
+                print("**Revoking access token**")
+                revocation.revoke(db_conn, claims["jti"], userid, claims["exp"])
+
+            body = request.body or {}
+
+            if "refresh_token" in body:
+                print("**Revoking refresh token family**")
+                refresh_tokens.revoke(
+                    db_conn, body["refresh_token"], userid, runtime.SECRET
+                )
+
+    #
+    # Respond in an HTTP-like way, i.e. with a status
+    # code and body in JSON format.
+    #
+    print("**DONE, returning success**")
+    return api_utils.success(200, {"success": 0})
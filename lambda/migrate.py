@@ -0,0 +1,424 @@
+"""Applies the versioned schema migrations in the migrations directory.
+
+Migrations are named NNNN_description.sql or NNNN_description.py and are
+applied in version order on top of budgetapp-create-database-tables-users.sql.
+Each applied version is recorded in the schema_migrations table, so running
+this again applies only the new ones. A .sql migration holds statements that
+each end with a semicolon at the end of a line; a .py migration defines an
+`upgrade(db_conn)` function, for changes that are easier to write in Python.
+
+MySQL commits DDL statements at once, so a migration that fails halfway is not
+rolled back. Fix the cause, undo its finished statements, and run again.
+
+Run from a directory containing lambda-config.ini:
+
+    python migrate.py up
+    python migrate.py status
+    python migrate.py check
+    python migrate.py rebuild-rollups
+
+`check` runs EXPLAIN on the hot queries and fails if any of them scans a whole
+table. Run it against a database with realistic data; on nearly empty tables
+MySQL may rightly prefer a scan. It also fails if any category's spent, or any
+monthly rollup, differs from the transactions it sums, which exact money makes
+a strict equality. `rebuild-rollups` regenerates the monthly rollups from the
+transactions.
+
+This file contains the following functions:
+
+    * find_migrations - lists the migration files in version order
+    * applied_versions - returns the versions recorded in schema_migrations
+    * split_statements - splits a .sql migration into statements
+    * apply_migration - applies and records one migration
+    * upgrade - applies every pending migration
+    * hot_queries - returns the queries that must use an index
+    * explain - returns the access type of each table a query reads
+    * check_queries - runs EXPLAIN on the hot queries and reports full scans
+    * check_spent - reports categories whose spent differs from their transactions
+    * check_rollups - reports monthly rollups that differ from their transactions
+"""
+
+import argparse
+import datetime
+import importlib.util
+import pathlib
+import re
+import sys
+
+import overview_function
+import query_function
+
+from utils import datatier, runtime, spending, usercache, rollups
+
+MIGRATIONS_DIR = pathlib.Path(__file__).parent / "migrations"
+
+#
+# Only one process migrates at a time; the others wait this many seconds.
+#
+LOCK_NAME = "budgetapp-migrate"
+LOCK_TIMEOUT_SECONDS = 60
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version int NOT NULL,
+  name varchar(256) NOT NULL,
+  appliedat datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (version)
+);
+"""
+
+RECORD_SQL = """
+INSERT INTO schema_migrations (version, name)
+VALUES (%s, %s);
+"""
+
+#
+# The transactions of one category, as deleting or merging a category reads
+# them.
+#
+CATEGORY_TRANSACTIONS_SQL = """
+SELECT transactionid
+FROM transactions
+WHERE userid = %s
+AND categoryid = %s;
+"""
+
+#
+# Categories whose spent is not exactly the sum of their transactions.
+#
+SPENT_DRIFT_SQL = """
+SELECT c.categoryid, c.spent, COALESCE(SUM(t.cost), 0) AS total
+FROM categories AS c
+LEFT JOIN transactions AS t ON t.categoryid = c.categoryid
+GROUP BY c.categoryid, c.spent
+HAVING c.spent <> total;
+"""
+
+#
+# Rollup rows that differ from, are missing from, or have no, transactions.
+#
+ROLLUP_DRIFT_SQL = """
+SELECT r.userid, r.yearmonth, r.categoryid
+FROM monthly_rollups AS r
+LEFT JOIN ({source}) AS t
+  ON t.userid = r.userid
+  AND t.yearmonth = r.yearmonth
+  AND t.categoryid = r.categoryid
+WHERE t.userid IS NULL
+OR r.total <> t.total
+OR r.count <> t.count
+OR r.smallest <> t.smallest
+OR r.largest <> t.largest
+UNION ALL
+SELECT t.userid, t.yearmonth, t.categoryid
+FROM ({source}) AS t
+LEFT JOIN monthly_rollups AS r
+  ON r.userid = t.userid
+  AND r.yearmonth = t.yearmonth
+  AND r.categoryid = t.categoryid
+WHERE r.userid IS NULL;
+""".format(
+    source="""
+    SELECT userid, EXTRACT(YEAR_MONTH FROM transactiondate) AS yearmonth,
+      categoryid, SUM(cost) AS total, COUNT(*) AS count, MIN(cost) AS smallest,
+      MAX(cost) AS largest
+    FROM transactions
+    GROUP BY userid, EXTRACT(YEAR_MONTH FROM transactiondate), categoryid
+    """
+)
+
+_MIGRATION_NAME = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+
+def find_migrations(directory: pathlib.Path = MIGRATIONS_DIR):
+    """Lists the migration files in version order.
+
+    Args:
+        directory (pathlib.Path): The directory to look in. Defaults to
+            MIGRATIONS_DIR.
+
+    Returns:
+        list[tuple[int, pathlib.Path]]: The version and path of each migration.
+
+    Raises:
+        ValueError: Two migrations share a version.
+    """
+    migrations = {}
+
+    for path in sorted(directory.iterdir()):
+        match = _MIGRATION_NAME.match(path.name)
+        if match is None:
+            continue
+
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError("duplicate migration version " + match.group(1))
+
+        migrations[version] = path
+
+    return sorted(migrations.items())
+
+
+def applied_versions(db_conn):
+    """Returns the versions recorded in schema_migrations, creating it if needed.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+
+    Returns:
+        set[int]: The versions applied so far.
+    """
+    datatier.perform_action(db_conn, CREATE_TABLE_SQL)
+    rows = datatier.retrieve_all_rows(db_conn, "SELECT version FROM schema_migrations;")
+
+    return {row[0] for row in rows}
+
+
+def split_statements(script: str):
+    """Splits a .sql migration into statements.
+
+    Lines starting with `--` are comments. A statement ends with a semicolon at
+    the end of a line, so semicolons inside a line are left alone.
+
+    Args:
+        script (str): The contents of the migration.
+
+    Returns:
+        list[str]: The statements, without their semicolons.
+    """
+    lines = [
+        line for line in script.splitlines() if not line.lstrip().startswith("--")
+    ]
+    statements = re.split(r";[ \t]*$", "\n".join(lines), flags=re.MULTILINE)
+
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def apply_migration(db_conn, version: int, path: pathlib.Path):
+    """Applies one migration and records it in schema_migrations.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        version (int): The migration's version.
+        path (pathlib.Path): The migration file.
+    """
+    print("**Applying " + path.name + "**")
+
+    if path.suffix == ".sql":
+        for statement in split_statements(path.read_text()):
+            datatier.perform_action(db_conn, statement)
+    else:
+        spec = importlib.util.spec_from_file_location("migration_" + path.stem, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(db_conn)
+
+    datatier.perform_action(db_conn, RECORD_SQL, [version, path.stem])
+
+
+def upgrade(db_conn, directory: pathlib.Path = MIGRATIONS_DIR):
+    """Applies every pending migration, holding a lock so only one process does.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        directory (pathlib.Path): The directory to look in. Defaults to
+            MIGRATIONS_DIR.
+
+    Returns:
+        list[int]: The versions applied by this call.
+
+    Raises:
+        TimeoutError: Another process held the lock for too long.
+    """
+    row = datatier.retrieve_one_row(
+        db_conn, "SELECT GET_LOCK(%s, %s);", [LOCK_NAME, LOCK_TIMEOUT_SECONDS]
+    )
+    if row == () or row[0] != 1:
+        raise TimeoutError("another process is applying migrations")
+
+    try:
+        # Read after taking the lock, so a finished run is not applied twice.
+        applied = applied_versions(db_conn)
+        done = []
+
+        for version, path in find_migrations(directory):
+            if version not in applied:
+                apply_migration(db_conn, version, path)
+                done.append(version)
+
+        return done
+    finally:
+        datatier.retrieve_one_row(db_conn, "SELECT RELEASE_LOCK(%s);", [LOCK_NAME])
+
+
+def hot_queries(userid: int):
+    """Returns the queries that must use an index, with sample parameters.
+
+    Args:
+        userid (int): The user to fill the queries in for.
+
+    Returns:
+        list[tuple[str, str, list[object]]]: The name, SQL and parameters of each
+            query.
+    """
+    today = datetime.date.today()
+    yearmonth, first, following = rollups.month_of(today)
+    rescan = [userid, 0, first, following, userid, yearmonth, 0, 0, 0]
+
+    #
+    # The last twelve whole months read the rollups, and the month to date
+    # week by week reads the transactions.
+    #
+    year_ago = first.replace(year=first.year - 1).isoformat()
+    last_month = (first - datetime.timedelta(days=1)).isoformat()
+    months, top = overview_function.build_queries(
+        userid, year_ago, last_month, False, "month"
+    )
+    weeks, _ = overview_function.build_queries(
+        userid, first.isoformat(), today.isoformat(), False, "week"
+    )
+
+    queries = [
+        ("overview months", *months),
+        ("overview weeks", *weeks),
+        ("overview top", *top),
+        ("user exists", usercache.EXISTS_SQL, [userid]),
+        ("category", spending.LOOKUP_SQL, [userid, ""]),
+        ("transaction lock", spending.TRANSACTION_SQL, [0, userid]),
+        ("rollup rescan", rollups.RESCAN_SQL, rescan),
+        ("category transactions", CATEGORY_TRANSACTIONS_SQL, [userid, 0]),
+    ]
+
+    for table in query_function.TABLES:
+        queries.append(("query " + table, query_function.table_query(table), [userid]))
+
+    return queries
+
+
+def explain(db_conn, sql: str, parameters: list[object]):
+    """Returns the access type of each table a query reads.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        sql (str): The query to explain.
+        parameters (list[object]): The query's parameters.
+
+    Returns:
+        list[tuple[str, str]]: The table and access type, e.g. `ref`, `range`
+            or `ALL` for a full scan, of each row of the plan.
+    """
+    with db_conn.cursor() as db_cursor:
+        db_cursor.execute("EXPLAIN " + sql.strip(), parameters)
+        columns = [column[0] for column in db_cursor.description]
+        rows = db_cursor.fetchall()
+
+    table = columns.index("table")
+    access = columns.index("type")
+
+    return [(row[table], row[access]) for row in rows]
+
+
+def check_queries(db_conn, userid: int):
+    """Runs EXPLAIN on the hot queries and reports any full table scan.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int): The user to fill the queries in for.
+
+    Returns:
+        bool: True if every hot query uses an index, otherwise false.
+    """
+    ok = True
+
+    for name, sql, parameters in hot_queries(userid):
+        for table, access in explain(db_conn, sql, parameters):
+            print(name + ": " + str(table) + " " + str(access))
+
+            if access == "ALL":
+                print("**FULL SCAN in " + name + "**")
+                ok = False
+
+    return ok
+
+
+def check_spent(db_conn):
+    """Reports categories whose spent differs from the sum of their transactions.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+
+    Returns:
+        bool: True if every category's spent matches, otherwise false.
+    """
+    rows = datatier.retrieve_all_rows(db_conn, SPENT_DRIFT_SQL)
+
+    for categoryid, spent, total in rows:
+        print(
+            "**SPENT DRIFT in category "
+            + str(categoryid)
+            + ": "
+            + str(spent)
+            + " != "
+            + str(total)
+            + "**"
+        )
+
+    return len(rows) == 0
+
+
+def check_rollups(db_conn):
+    """Reports monthly rollups that differ from the transactions they sum.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+
+    Returns:
+        bool: True if every rollup matches, otherwise false.
+    """
+    rows = datatier.retrieve_all_rows(db_conn, ROLLUP_DRIFT_SQL)
+
+    for userid, yearmonth, categoryid in rows:
+        print(
+            "**ROLLUP DRIFT for user "
+            + str(userid)
+            + " in "
+            + str(yearmonth)
+            + ", category "
+            + str(categoryid)
+            + "**"
+        )
+
+    return len(rows) == 0
+
+
+def main():
+    """Parses the command line and runs the requested command."""
+    parser = argparse.ArgumentParser(description="Migrate the budget app schema.")
+    parser.add_argument("command", choices=["up", "status", "check", "rebuild-rollups"])
+    parser.add_argument(
+        "--userid", type=int, default=80001, help="the user to explain queries for"
+    )
+    args = parser.parse_args()
+
+    with datatier.acquire_db_conn(*runtime.RDS_SETTINGS) as db_conn:
+        if args.command == "up":
+            done = upgrade(db_conn)
+            print("**Applied " + str(len(done)) + " migration(s)**")
+        elif args.command == "status":
+            applied = applied_versions(db_conn)
+            for version, path in find_migrations():
+                state = "applied" if version in applied else "pending"
+                print(path.name + ": " + state)
+        elif args.command == "rebuild-rollups":
+            users = rollups.rebuild(db_conn)
+            print("**Rebuilt monthly rollups for " + str(users) + " user(s)**")
+        else:
+            indexed = check_queries(db_conn, args.userid)
+            spent = check_spent(db_conn)
+            rolled_up = check_rollups(db_conn)
+            if not indexed or not spent or not rolled_up:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+-- Composite indexes for the hot paths. Each table is altered once, so it is
+-- rebuilt only once.
+--
+-- transactions (userid, transactiondate, cost): the overview's range scans,
+--   which read cost straight from the index.
+-- transactions (userid, category): moving and deleting a category's rows.
+-- categories (userid, category): the spent lookups, and no duplicate names.
+-- recurringpayments (userid, duedate): a user's payments in due date order.
+--
+-- A user's categories that share a name are merged first, into the one with
+-- the lowest categoryid, so the unique index can be created. Transactions and
+-- recurring payments refer to categories by name, so they need no change.
+
+UPDATE categories AS c
+JOIN (
+  SELECT MIN(categoryid) AS keep, SUM(spent) AS spent,
+    MAX(totalbudget) AS totalbudget
+  FROM categories
+  GROUP BY userid, category
+  HAVING COUNT(*) > 1
+) AS d ON d.keep = c.categoryid
+SET c.spent = d.spent,
+  c.totalbudget = COALESCE(c.totalbudget, d.totalbudget);
+
+DELETE c
+FROM categories AS c
+JOIN (
+  SELECT userid, category, MIN(categoryid) AS keep
+  FROM categories
+  GROUP BY userid, category
+  HAVING COUNT(*) > 1
+) AS d ON d.userid = c.userid
+  AND d.category = c.category
+WHERE c.categoryid <> d.keep;
+
+ALTER TABLE transactions
+  ADD INDEX transactions_user_date_cost (userid, transactiondate, cost),
+  ADD INDEX transactions_user_category (userid, category);
+
+ALTER TABLE categories
+  ADD UNIQUE INDEX categories_user_category (userid, category);
+
+ALTER TABLE recurringpayments
+  ADD INDEX recurringpayments_user_duedate (userid, duedate);
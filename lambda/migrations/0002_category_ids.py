@@ -0,0 +1,105 @@
+"""Makes transactions and recurring payments refer to categories by ID.
+
+Both tables copied the category's name into a varchar(256) column. This adds a
+categoryid foreign key instead, fills it in a batch of rows at a time, so no
+statement locks a whole table for long, and then drops the name column.
+
+A row whose category no longer exists gets a category of that name, with no
+budget and the row's costs as its spent, so no row is lost.
+
+This file contains the following functions:
+
+    * upgrade - applies the migration
+"""
+
+from utils import datatier
+
+#
+# How many rows, by primary key range, each backfill statement covers.
+#
+BATCH_SIZE = 1000
+
+ADD_COLUMN_SQL = """
+ALTER TABLE {table}
+  ADD COLUMN categoryid int DEFAULT NULL AFTER userid;
+"""
+
+RESTORE_FROM_TRANSACTIONS_SQL = """
+INSERT INTO categories (category, userid, totalbudget, spent)
+SELECT t.category, t.userid, NULL, SUM(t.cost)
+FROM transactions AS t
+LEFT JOIN categories AS c
+  ON c.userid = t.userid
+  AND c.category = t.category
+WHERE c.categoryid IS NULL
+GROUP BY t.userid, t.category;
+"""
+
+RESTORE_FROM_PAYMENTS_SQL = """
+INSERT IGNORE INTO categories (category, userid, totalbudget, spent)
+SELECT DISTINCT r.category, r.userid, NULL, 0
+FROM recurringpayments AS r
+LEFT JOIN categories AS c
+  ON c.userid = r.userid
+  AND c.category = r.category
+WHERE c.categoryid IS NULL;
+"""
+
+BACKFILL_SQL = """
+UPDATE {table} AS t
+JOIN categories AS c
+  ON c.userid = t.userid
+  AND c.category = t.category
+SET t.categoryid = c.categoryid
+WHERE t.{key} > %s
+AND t.{key} <= %s
+AND t.categoryid IS NULL;
+"""
+
+#
+# The index on categoryid also serves the foreign key.
+#
+FINISH_TRANSACTIONS_SQL = """
+ALTER TABLE transactions
+  MODIFY categoryid int NOT NULL,
+  DROP INDEX transactions_user_category,
+  DROP COLUMN category,
+  ADD INDEX transactions_category (categoryid),
+  ADD FOREIGN KEY (categoryid) REFERENCES categories (categoryid);
+"""
+
+FINISH_PAYMENTS_SQL = """
+ALTER TABLE recurringpayments
+  MODIFY categoryid int NOT NULL,
+  DROP COLUMN category,
+  ADD INDEX recurringpayments_category (categoryid),
+  ADD FOREIGN KEY (categoryid) REFERENCES categories (categoryid);
+"""
+
+TABLES = [("transactions", "transactionid"), ("recurringpayments", "paymentid")]
+
+
+def upgrade(db_conn):
+    """Applies the migration.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+    """
+    for table, _ in TABLES:
+        datatier.perform_action(db_conn, ADD_COLUMN_SQL.format(table=table))
+
+    print("**Restoring missing categories**")
+    datatier.perform_action(db_conn, RESTORE_FROM_TRANSACTIONS_SQL)
+    datatier.perform_action(db_conn, RESTORE_FROM_PAYMENTS_SQL)
+
+    for table, key in TABLES:
+        print("**Backfilling " + table + "**")
+        sql = "SELECT COALESCE(MAX(" + key + "), 0) FROM " + table + ";"
+        last = datatier.retrieve_one_row(db_conn, sql)[0]
+
+        backfill = BACKFILL_SQL.format(table=table, key=key)
+        for start in range(0, last, BATCH_SIZE):
+            datatier.perform_action(db_conn, backfill, [start, start + BATCH_SIZE])
+
+    datatier.perform_action(db_conn, FINISH_TRANSACTIONS_SQL)
+    datatier.perform_action(db_conn, FINISH_PAYMENTS_SQL)
@@ -0,0 +1,22 @@
+-- Money becomes DECIMAL(12,2), exact to the cent up to 9,999,999,999.99.
+-- FLOAT values are rounded to the nearest cent on the way.
+
+ALTER TABLE transactions
+  MODIFY cost decimal(12,2) NOT NULL;
+
+ALTER TABLE recurringpayments
+  MODIFY cost decimal(12,2) NOT NULL;
+
+ALTER TABLE categories
+  MODIFY totalbudget decimal(12,2) DEFAULT NULL,
+  MODIFY spent decimal(12,2) NOT NULL;
+
+-- FLOAT arithmetic let spent drift from its transactions. Recompute it once
+-- from the rounded costs; from here on the deltas keep it exact.
+UPDATE categories AS c
+LEFT JOIN (
+  SELECT categoryid, SUM(cost) AS total
+  FROM transactions
+  GROUP BY categoryid
+) AS t ON t.categoryid = c.categoryid
+SET c.spent = COALESCE(t.total, 0);
@@ -0,0 +1,33 @@
+"""Adds the monthly_rollups table and fills it from the existing transactions.
+
+This file contains the following functions:
+
+    * upgrade - applies the migration
+"""
+
+from utils import datatier, rollups
+
+CREATE_TABLE_SQL = """
+CREATE TABLE monthly_rollups (
+  userid int NOT NULL,
+  yearmonth int NOT NULL,
+  categoryid int NOT NULL,
+  total decimal(12,2) NOT NULL,
+  count int NOT NULL,
+  smallest decimal(12,2) NOT NULL,
+  largest decimal(12,2) NOT NULL,
+  PRIMARY KEY (userid, yearmonth, categoryid)
+);
+"""
+
+
+def upgrade(db_conn):
+    """Applies the migration.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+    """
+    datatier.perform_action(db_conn, CREATE_TABLE_SQL)
+
+    print("**Building monthly rollups**")
+    rollups.rebuild(db_conn)
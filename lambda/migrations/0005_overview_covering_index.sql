@@ -0,0 +1,9 @@
+-- Replaces the overview's (userid, transactiondate, cost) index with one that
+-- also holds categoryid, so a range's totals per category and week or month
+-- are read from the index alone, in one range scan. The new index still serves
+-- the top transactions and everything that used the old one.
+
+ALTER TABLE transactions
+  ADD INDEX transactions_user_date_category_cost
+    (userid, transactiondate, categoryid, cost),
+  DROP INDEX transactions_user_date_cost;
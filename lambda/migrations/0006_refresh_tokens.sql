@@ -0,0 +1,18 @@
+-- Refresh tokens, stored as hashes. Every token issued from one login shares a
+-- familyid, so reusing a spent token revokes the whole family.
+--
+-- Databases bootstrapped while the script still created this table keep it.
+
+CREATE TABLE IF NOT EXISTS refreshtokens (
+  tokenid int NOT NULL AUTO_INCREMENT,
+  userid int NOT NULL,
+  tokenhash char(64) NOT NULL,
+  familyid char(32) NOT NULL,
+  expires datetime NOT NULL,
+  usedat datetime DEFAULT NULL,
+  revoked tinyint NOT NULL DEFAULT 0,
+  PRIMARY KEY (tokenid),
+  UNIQUE (tokenhash),
+  KEY (familyid),
+  FOREIGN KEY (userid) REFERENCES users (userid)
+);
@@ -0,0 +1,12 @@
+-- Revoked access tokens, by their jti claim, kept until the token would have
+-- expired anyway.
+--
+-- Databases bootstrapped while the script still created this table keep it.
+
+CREATE TABLE IF NOT EXISTS revokedtokens (
+  jti char(32) NOT NULL,
+  userid int NOT NULL,
+  expires datetime NOT NULL,
+  PRIMARY KEY (jti),
+  KEY (expires)
+);
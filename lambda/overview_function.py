@@ -1,162 +1,400 @@
 """Handles the event that a `GET: /overview` request is received.
 
-This gets and returns information for an overview of the user's budget.
+This gets and returns information for an overview of the user's budget, for
+one month or for any range of dates split into weeks, months, quarters or
+years to date.
 """
 
-import os
+import bisect
+import calendar
+import datetime
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
+from utils import datatier, api_utils, runtime, usercache
 
+#
+# How a range can be split into buckets, and the most buckets and top
+# transactions one request may ask for.
+#
+GRANULARITIES = ["week", "month", "quarter", "ytd"]
+MAX_BUCKETS = 60
+DEFAULT_TOP = 3
+MAX_TOP = 50
 
-def lambda_handler(event, context):
-    """Gets an overview of the user's budget.
+#
+# Totals per category and month, for ranges of whole months. The monthly
+# rollups cost the same however many transactions the months hold.
+#
+ROLLUP_BREAKDOWN_SQL = """
+SELECT r.yearmonth, c.category, SUM(r.total)
+FROM monthly_rollups AS r
+JOIN categories AS c ON c.categoryid = r.categoryid
+WHERE r.userid = %s
+AND r.yearmonth >= %s
+AND r.yearmonth <= %s
+GROUP BY r.yearmonth, c.category;
+"""
+
+#
+# Totals per category and grain, for any other range. The range is half-open
+# and compares the bare column, so this is one range scan of the
+# (userid, transactiondate, categoryid, cost) index, which covers it.
+#
+TRANSACTION_BREAKDOWN_SQL = """
+SELECT {grain} AS grain, c.category, SUM(t.cost)
+FROM transactions AS t
+JOIN categories AS c ON c.categoryid = t.categoryid
+WHERE t.userid = %s
+AND t.transactiondate >= %s
+AND t.transactiondate < %s
+GROUP BY grain, c.category;
+"""
+
+#
+# Weeks are grouped by the Monday they start on, everything else by month, so
+# every bucket is made of whole grains.
+#
+GRAINS = {
+    "week": "t.transactiondate - INTERVAL WEEKDAY(t.transactiondate) DAY",
+    "month": "EXTRACT(YEAR_MONTH FROM t.transactiondate)",
+}
+
+TOP_SQL = """
+SELECT name, cost, transactiondate
+FROM transactions
+WHERE userid = %s
+AND transactiondate >= %s
+AND transactiondate < %s
+ORDER BY cost DESC
+LIMIT %s;
+"""
+
+
+def get_range(request: runtime.Request):
+    """Reads the range of dates to summarize from the request's query parameters.
+
+    The range is either `begin` and `end` dates, as YYYY-MM-DD or YYYYMMDD, or
+    a `year` and `month`. With neither, `granularity=ytd` summarizes the year
+    to date.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
-        dict: The success response containing `sum`, `top_3`, `begin_range`, and
-            `end_range` or an error response.
+        tuple[dict | None, str | None, str | None]: An error response, or None and
+            the first and last dates of the range.
     """
+    parameters = request.query_parameters
+    if not parameters:
+        return api_utils.error(400, "no query parameters in request"), None, None
+
     try:
-        print("**STARTING**")
-        print("**Lambda: Overview**")
+        if "begin" in parameters or "end" in parameters:
+            begin = datetime.date.fromisoformat(str(parameters["begin"]))
+            end = datetime.date.fromisoformat(str(parameters["end"]))
+        elif "year" in parameters or "month" in parameters:
+            year = int(parameters["year"])
+            month = int(parameters["month"])
+            _, last_day = calendar.monthrange(year, month)
+            begin = datetime.date(year, month, 1)
+            end = datetime.date(year, month, last_day)
+        elif parameters.get("granularity") == "ytd":
+            end = datetime.date.today()
+            begin = end.replace(month=1, day=1)
+        else:
+            return api_utils.error(400, "no date range in request"), None, None
+    except KeyError as err:
+        return api_utils.error(400, "missing query parameter: " + str(err)), None, None
+    except ValueError:
+        return api_utils.error(400, "invalid date range"), None, None
 
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
+    if begin > end:
+        return api_utils.error(400, "begin is after end"), None, None
 
-        configur = ConfigParser()
-        configur.read(config_file)
+    #
+    # The bucket after the last one, and the day after the range, must still
+    # be a date, so the range has to end before the last year there is.
+    #
+    if end.year >= datetime.MAXYEAR:
+        return api_utils.error(400, "invalid date range"), None, None
 
-        #
-        # Configure for RDS access
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
+    return None, begin.isoformat(), end.isoformat()
 
-        #
-        # Read the token from the event body.
-        #
-        print("**Accessing request headers**")
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
 
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
+def get_options(request: runtime.Request, begin_range: str, end_range: str):
+    """Reads the granularity and number of top transactions to return.
 
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
-        try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+        begin_range (str): The first date of the range.
+        end_range (str): The last date of the range.
 
-        #
-        # Read month and year from the event body.
-        #
-        if "queryStringParameters" not in event:
-            return api_utils.error(400, "no query parameters in request")
-
-        month = int(event["queryStringParameters"]["month"])
-        year = str(event["queryStringParameters"]["year"])
-        end_date = ""
-
-        match month:
-            case 1 | 3 | 5 | 7 | 8 | 10 | 12:
-                end_date = "31"
-            case 4 | 6 | 9 | 11:
-                end_date = "30"
-            case 2:
-                if int(year) % 4 == 0:
-                    end_date = "29"
-                else:
-                    end_date = "28"
-
-        month = "{0:0=2d}".format(month)
-        begin_range = year + "-" + month + "-01"
-        end_range = year + "-" + month + "-" + end_date
+    Returns:
+        tuple[dict | None, str | None, int | None]: An error response, or None and
+            the granularity and the number of top transactions.
+    """
+    parameters = request.query_parameters
 
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
+    granularity = parameters.get("granularity", "month")
+    if granularity not in GRANULARITIES:
+        return api_utils.error(400, "invalid granularity: " + granularity), None, None
+
+    try:
+        top = int(parameters.get("top", DEFAULT_TOP))
+    except ValueError:
+        top = 0
+
+    if top < 1 or top > MAX_TOP:
+        message = "top must be between 1 and " + str(MAX_TOP)
+        return api_utils.error(400, message), None, None
+
+    if len(get_buckets(begin_range, end_range, granularity)) > MAX_BUCKETS:
+        message = "too many buckets, at most " + str(MAX_BUCKETS) + " are allowed"
+        return api_utils.error(400, message), None, None
+
+    return None, granularity, top
+
+
+def next_bucket(date: datetime.date, granularity: str):
+    """Returns the first day of the bucket after the one a date falls in.
+
+    Args:
+        date (datetime.date): The date.
+        granularity (str): One of GRANULARITIES.
+
+    Returns:
+        datetime.date: The first day of the next bucket.
+    """
+    if granularity == "week":
+        return date + datetime.timedelta(days=7 - date.weekday())
+
+    if granularity == "ytd":
+        return datetime.date(date.year + 1, 1, 1)
+
+    months = 3 if granularity == "quarter" else 1
+    month = (date.month - 1) // months * months + months
+
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def get_buckets(begin_range: str, end_range: str, granularity: str):
+    """Splits a range of dates into buckets.
+
+    The first and last buckets are cut short where the range starts or ends
+    part way through them.
+
+    Args:
+        begin_range (str): The first date of the range.
+        end_range (str): The last date of the range.
+        granularity (str): One of GRANULARITIES.
+
+    Returns:
+        list[tuple[datetime.date, datetime.date]]: The first and last date of
+            each bucket, in order.
+    """
+    end = datetime.date.fromisoformat(end_range)
+    first = datetime.date.fromisoformat(begin_range)
+    buckets = []
+
+    while first <= end and len(buckets) <= MAX_BUCKETS:
+        following = next_bucket(first, granularity)
+        buckets.append((first, min(following - datetime.timedelta(days=1), end)))
+        first = following
+
+    return buckets
+
+
+def build_queries(
+    userid: str,
+    begin_range: str,
+    end_range: str,
+    check_user: bool,
+    granularity: str = "month",
+    top: int = DEFAULT_TOP,
+):
+    """Builds the overview queries, which do not depend on each other.
+
+    1st Query: Whether the user exists, if check_user is set
+    2nd Query: Totals per category and month, or week, in the range
+    3rd Query: The most expensive transactions in the range
+
+    Args:
+        userid (str): The current user's ID.
+        begin_range (str): The first date of the range.
+        end_range (str): The last date of the range.
+        check_user (bool): Whether to check that the user exists, i.e. whether
+            the user cache had no answer.
+        granularity (str): One of GRANULARITIES. Defaults to "month".
+        top (int): How many of the most expensive transactions to return.
+            Defaults to DEFAULT_TOP.
+
+    Returns:
+        list[tuple[str, list[object]]]: (sql, parameters) pairs for
+            retrieve_parallel() or retrieve_many().
+    """
+    begin = datetime.date.fromisoformat(begin_range)
+    end = datetime.date.fromisoformat(end_range)
+    day_after = (end + datetime.timedelta(days=1)).isoformat()
+
+    if granularity != "week" and begin.day == 1 and day_after.endswith("-01"):
+        breakdown = (
+            ROLLUP_BREAKDOWN_SQL,
+            [userid, begin.year * 100 + begin.month, end.year * 100 + end.month],
+        )
+    else:
+        grain = GRAINS["week" if granularity == "week" else "month"]
+        breakdown = (
+            TRANSACTION_BREAKDOWN_SQL.format(grain=grain),
+            [userid, begin_range, day_after],
         )
 
-        print("**Checking if userid is valid**")
-        sql = "SELECT * FROM users WHERE userid = %s;"
-        row = datatier.retrieve_one_row(db_conn, sql, [userid])
+    queries = [
+        breakdown,
+        (TOP_SQL, [userid, begin_range, day_after, top]),
+    ]
+
+    if check_user:
+        queries.insert(0, (usercache.EXISTS_SQL, [userid]))
+
+    return queries
+
 
-        if row == ():  # no such user
+def build_response(
+    userid: str,
+    results: list[tuple],
+    begin_range: str,
+    end_range: str,
+    granularity: str = "month",
+):
+    """Turns the results of the overview queries into a response.
+
+    Args:
+        userid (str): The current user's ID.
+        results (list[tuple]): The results of the queries from build_queries().
+        begin_range (str): The first date of the range.
+        end_range (str): The last date of the range.
+        granularity (str): One of GRANULARITIES. Defaults to "month".
+
+    Returns:
+        dict: The success response containing `sum`, `categories`, `buckets`,
+            `top`, `top_3`, `granularity`, `begin_range`, and `end_range` or an
+            error response.
+    """
+    if len(results) == 3:
+        users = results.pop(0)
+        usercache.remember(userid, users != ())
+
+        if users == ():  # no such user
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
-        #
-        # 1st Query: Sum of transactions for that month
-        # 2nd Query: 3 most expensive transactions
-        #
-        query_1 = """
-        SELECT SUM(cost)
-        FROM transactions
-        WHERE userid = %s
-        AND date(transactiondate) >= %s
-        AND date(transactiondate) <= %s;
-        """
-
-        query_2 = """
-        SELECT name, cost, transactiondate
-        FROM transactions
-        WHERE userid = %s
-        AND date(transactiondate) >= %s
-        AND date(transactiondate) <= %s
-        ORDER BY cost DESC
-        LIMIT 3;
-        """
-
-        res_1 = datatier.retrieve_one_row(
-            db_conn, query_1, [userid, begin_range, end_range]
-        )
-        res_2 = datatier.retrieve_all_rows(
-            db_conn, query_2, [userid, begin_range, end_range]
-        )
-        top_3 = []
+    breakdown, most_expensive = results
 
-        if res_1 == ():
-            res_1 = [0]
-        if res_2 == []:
-            res_2 = "No transactions found!"
-        else:
-            for row in res_2:
-                transaction = (row[0], row[1], str(row[2]))
-                top_3.append(transaction)
+    buckets = get_buckets(begin_range, end_range, granularity)
+    starts = [first for first, _ in buckets]
+    totals = [{} for _ in buckets]
+
+    for grain, category, total in breakdown:
+        if isinstance(grain, int):  # YYYYMM
+            grain = datetime.date(grain // 100, grain % 100, 1)
+
+        # A grain that starts before the range belongs to the first bucket.
+        index = max(bisect.bisect_right(starts, grain) - 1, 0)
+        totals[index][category] = totals[index].get(category, 0) + total
+
+    categories = {}
+    for bucket_totals in totals:
+        for category, total in bucket_totals.items():
+            categories[category] = categories.get(category, 0) + total
+
+    top = [(row[0], row[1], str(row[2])) for row in most_expensive]
+
+    #
+    # Respond in an HTTP-like way, i.e. with a status
+    # code and body in JSON format.
+    #
+    print("**DONE, returning totals and top transactions**")
+    return api_utils.success(
+        200,
+        {
+            "sum": sum(categories.values()) if categories else None,
+            "categories": by_total(categories),
+            "buckets": [
+                {
+                    "begin_range": first.isoformat(),
+                    "end_range": last.isoformat(),
+                    "sum": sum(bucket_totals.values()),
+                    "categories": by_total(bucket_totals),
+                }
+                for (first, last), bucket_totals in zip(buckets, totals)
+            ],
+            "top": top,
+            "top_3": top[:3],
+            "granularity": granularity,
+            "begin_range": begin_range,
+            "end_range": end_range,
+        },
+    )
+
+
+def by_total(totals: dict):
+    """Orders category totals from the largest to the smallest.
+
+    Args:
+        totals (dict): The total of each category, keyed by name.
+
+    Returns:
+        dict: The same totals, largest first.
+    """
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+@runtime.handler("Overview", requires_token=True)
+def lambda_handler(request: runtime.Request):
+    """Gets an overview of the user's budget.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing `sum`, `categories`, `buckets`,
+            `top`, `top_3`, `granularity`, `begin_range`, and `end_range` or an
+            error response.
+    """
+    #
+    # Read the range and how to split it from the query parameters.
+    #
+    response, begin_range, end_range = get_range(request)
+    if response is not None:
+        return response
+
+    response, granularity, top = get_options(request, begin_range, end_range)
+    if response is not None:
+        return response
+
+    #
+    # Open connection to the database.
+    #
+    userid = request.userid
+
+    known = usercache.lookup(userid)
+    if known is False:
+        return api_utils.error(404, "no such user")
+
+    print("**Opening connection**")
+    settings = request.rds_settings(read_only=True)
+
+    with datatier.acquire_db_conn(*settings) as db_conn:
         #
-        # Respond in an HTTP-like way, i.e. with a status
-        # code and body in JSON format.
+        # The queries run at the same time on separate connections, so this
+        # waits only as long as the slowest of them.
         #
-        print("**DONE, returning sum and top three transactions**")
-        return api_utils.success(
-            200,
-            {
-                "sum": res_1[0],
-                "top_3": top_3,
-                "begin_range": begin_range,
-                "end_range": end_range,
-            },
+        print("**Checking if userid is valid and summarizing transactions**")
+        results = datatier.retrieve_parallel(
+            db_conn,
+            settings,
+            build_queries(
+                userid, begin_range, end_range, known is None, granularity, top
+            ),
         )
 
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
+        return build_response(userid, results, begin_range, end_range, granularity)
@@ -0,0 +1,221 @@
+"""Serves the API from several pre-forked worker processes on one socket.
+
+bcrypt and the JSON encoding of large responses are CPU-bound, so threads in
+one process take turns on the GIL. This server opens the listening socket once
+and forks worker processes that all accept from it, so /auth and /users scale
+with the number of cores.
+
+Each worker runs server.ThreadPoolHTTPServer on the shared socket, with a few
+threads and its own database pools. A worker exits after serving about
+`--max-requests` requests, and the supervisor replaces any worker that exits,
+whether recycled or crashed.
+
+Run from a directory containing lambda-config.ini:
+
+    python prefork_server.py --port 8080 --processes 4 --threads 4
+
+This file contains the following classes:
+
+    * RecyclingRequestHandler - a RequestHandler that counts requests per worker
+
+This file contains the following functions:
+
+    * run_worker - serves requests in a forked worker process until recycled
+    * serve - starts the workers and supervises them until terminated
+"""
+
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+
+import server
+
+#
+# Workers recycle after max_requests plus up to this fraction of it, so that
+# they do not all restart at the same moment.
+#
+MAX_REQUESTS_JITTER = 0.1
+
+#
+# A worker that dies sooner than this after starting is assumed to be failing
+# on startup, and is restarted only after waiting this long.
+#
+RESTART_BACKOFF_SECONDS = 1
+
+
+class RecyclingRequestHandler(server.RequestHandler):
+    """A RequestHandler that shuts its worker down after enough requests."""
+
+    def handle_request(self):
+        """Dispatches the current request, then counts it against the limit."""
+        try:
+            super().handle_request()
+        finally:
+            self.server.count_request()
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_PUT = handle_request
+    do_DELETE = handle_request
+
+
+def run_worker(listener: socket.socket, threads: int, max_requests: int):
+    """Serves requests in a forked worker process until it is recycled.
+
+    Args:
+        listener (socket.socket): The listening socket shared by all workers.
+        threads (int): The number of worker threads in this process.
+        max_requests (int): How many requests to serve before exiting, or 0 to
+            serve until terminated.
+
+    Returns:
+        int: The exit status for the worker process.
+    """
+    # The supervisor forwards shutdown as SIGTERM; ignore the terminal's SIGINT.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    httpd = server.ThreadPoolHTTPServer(
+        None, threads, handler_class=RecyclingRequestHandler, listener=listener
+    )
+
+    limit = 0
+    if max_requests > 0:
+        limit = max_requests + random.randint(
+            0, int(max_requests * MAX_REQUESTS_JITTER)
+        )
+
+    served = 0
+    lock = threading.Lock()
+    stopping = threading.Event()
+
+    def stop():
+        if not stopping.is_set():
+            stopping.set()
+            httpd.stop()
+
+    def count_request():
+        nonlocal served
+
+        with lock:
+            served += 1
+            if limit and served >= limit:
+                print(f"**Worker {os.getpid()} recycling after {served} requests**")
+                stop()
+
+    httpd.count_request = count_request
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+
+    server.serve_until_stopped(httpd)
+
+    return 0
+
+
+def _spawn(listener: socket.socket, threads: int, max_requests: int):
+    """Forks one worker process.
+
+    Args:
+        listener (socket.socket): The listening socket shared by all workers.
+        threads (int): The number of worker threads per process.
+        max_requests (int): See run_worker().
+
+    Returns:
+        int: The process ID of the new worker.
+    """
+    pid = os.fork()
+
+    if pid == 0:
+        status = 1
+        try:
+            status = run_worker(listener, threads, max_requests)
+        except BaseException as err:
+            print("**ERROR**")
+            print(str(err))
+        finally:
+            sys.stdout.flush()
+            os._exit(status)
+
+    return pid
+
+
+def serve(host: str, port: int, processes: int, threads: int, max_requests: int):
+    """Starts the workers and supervises them until SIGINT or SIGTERM.
+
+    On shutdown, each worker stops accepting connections and lets its
+    in-flight requests finish before exiting.
+
+    Args:
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        processes (int): The number of worker processes.
+        threads (int): The number of worker threads per process.
+        max_requests (int): See run_worker().
+    """
+    listener = socket.create_server((host, port), backlog=128)
+
+    # Every worker wakes up for each new connection, but only one accepts it.
+    # The rest must get an error instead of blocking in accept().
+    listener.setblocking(False)
+
+    stopping = False
+    workers = {}
+
+    def stop(signum, frame):
+        nonlocal stopping
+
+        if not stopping:
+            print("**Shutting down**")
+            stopping = True
+            for pid in list(workers):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"**Serving on {host}:{port} with {processes} processes**")
+    for _ in range(processes):
+        workers[_spawn(listener, threads, max_requests)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        code = os.waitstatus_to_exitcode(status)
+        if code != 0:
+            print(f"**Worker {pid} crashed with status {code}, restarting**")
+            if time.monotonic() - started < RESTART_BACKOFF_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+
+        if not stopping:
+            workers[_spawn(listener, threads, max_requests)] = time.monotonic()
+
+    listener.close()
+    print("**DONE**")
+
+
+def main():
+    """Parses the command line and runs the server."""
+    parser = argparse.ArgumentParser(description="Serve the budget app API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--max-requests", type=int, default=10000)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.processes, args.threads, args.max_requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,126 +3,131 @@
 This gets and returns the queried information.
 """
 
-import os
+from utils import datatier, api_utils, runtime, usercache
+
+
+#
+# The query for each table that can be queried. Transactions and recurring
+# payments store a categoryid, and are joined back to the category's name so
+# that each row keeps the shape clients expect.
+#
+QUERIES = {
+    "categories": """
+    SELECT categoryid, category, userid, totalbudget, spent
+    FROM categories
+    WHERE userid = %s
+    """,
+    "transactions": """
+    SELECT t.transactionid, t.userid, t.name, t.cost, c.category, t.transactiondate
+    FROM transactions AS t
+    JOIN categories AS c ON c.categoryid = t.categoryid
+    WHERE t.userid = %s
+    """,
+    "recurringpayments": """
+    SELECT r.paymentid, r.paymentname, r.userid, c.category, r.cost, r.duedate
+    FROM recurringpayments AS r
+    JOIN categories AS c ON c.categoryid = r.categoryid
+    WHERE r.userid = %s
+    """,
+}
+
+#
+# The tables that can be queried.
+#
+TABLES = list(QUERIES)
+
+
+def table_query(table: str):
+    """Returns the query for all of a user's rows in one of TABLES.
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
+    Args:
+        table (str): The table to query, which must be in TABLES.
 
+    Returns:
+        str: The SELECT query, taking the user's ID as its one parameter.
+    """
+    return QUERIES[table]
 
-def lambda_handler(event, context):
-    """Queries information from the database.
 
-    Query uses a path parameter {args} to specify a table to query from. Supported args
-    are 'categories', 'transactions', or 'recurringpayments', for which query returns
-    all rows in the specified table whose userid matches the id of the user who called
-    query.
+def build_query(request: runtime.Request):
+    """Reads the table to query from the request's path parameters.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
-        dict: The success response containing `rows` or an error response.
+        tuple[dict | None, str | None]: An error response, or None and the SELECT
+            query for the requested table.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Query**")
+    event = request.event
 
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
+    if "args" in event:
+        args = event["args"]
+    elif "pathParameters" in event:
+        if "args" in request.path_parameters:
+            args = request.path_parameters["args"]
+        else:
+            return api_utils.error(400, "no args in pathParameters"), None
+    else:
+        return api_utils.error(400, "no args in event"), None
 
-        configur = ConfigParser()
-        configur.read(config_file)
+    split_args = args.split(",")
 
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
+    if len(split_args) > 1:
+        return (
+            api_utils.error(
+                400, "Implement functionality for query with more than one argument"
+            ),
+            None,
+        )
 
-        #
-        # Read the token from the event body.
-        #
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
+    type = args
 
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
+    if type not in TABLES:
+        return api_utils.error(500, "Invalid query type"), None
 
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
+    return None, table_query(type)
 
-        try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
 
-        #
-        # Read the arguments from the event body.
-        #
-        if "args" in event:
-            args = event["args"]
-        elif "pathParameters" in event:
-            if "args" in event["pathParameters"]:
-                args = event["pathParameters"]["args"]
-            else:
-                return api_utils.error(400, "no args in pathParameters")
-        else:
-            return api_utils.error(400, "no args in event")
-
-        split_args = args.split(",")
-
-        if len(split_args) > 1:
-            return api_utils.error(
-                400, "Implement functionality for query with more than one argument"
-            )
+@runtime.handler("Query", requires_token=True)
+def lambda_handler(request: runtime.Request):
+    """Queries information from the database.
 
-        type = args
+    Query uses a path parameter {args} to specify a table to query from. Supported args
+    are 'categories', 'transactions', or 'recurringpayments', for which query returns
+    all rows in the specified table whose userid matches the id of the user who called
+    query.
 
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
+    Args:
+        request (runtime.Request): The parsed HTTP request.
 
+    Returns:
+        dict: The success response containing `rows` or an error response.
+    """
+    #
+    # Read the arguments from the event body.
+    #
+    userid = request.userid
+
+    response, sql = build_query(request)
+    if response is not None:
+        return response
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn(read_only=True) as db_conn:
         print("**Checking if userid is valid**")
-        sql = "SELECT * FROM users WHERE userid = %s;"
-        row = datatier.retrieve_one_row(db_conn, sql, [userid])
-
-        if row == ():  # no such user
+        if not usercache.user_exists(db_conn, userid):
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
-        if type not in ["categories", "transactions", "recurringpayments"]:
-            return api_utils.error(500, "Invalid query type")
-
-        sql = """
-        SELECT *
-        FROM """ + type + """
-        WHERE userid = %s
-        """
-
-        rows = datatier.retrieve_all_rows(db_conn, sql, [userid])
+        rows = datatier.stream_rows(db_conn, sql, [userid])
 
         #
         # Respond in an HTTP-like way, i.e. with a status
         # code and body in JSON format.
         #
         print("**DONE**")
-        return api_utils.success(200, {"rows": rows})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
+        return api_utils.success_rows(200, rows)
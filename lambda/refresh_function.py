@@ -0,0 +1,50 @@
+"""Handles the event that a `POST: /auth/refresh` request is received.
+
+This exchanges a refresh token for a new access token and refresh token, so a
+client can stay logged in without sending its password again.
+"""
+
+from utils import auth, api_utils, runtime, refresh_tokens
+
+
+@runtime.handler("Refresh", requires_body=True)
+def lambda_handler(request: runtime.Request):
+    """Exchanges a refresh token for a new access token.
+
+    Args:
+        request (runtime.Request): The parsed HTTP request.
+
+    Returns:
+        dict: The success response containing an `access_token` and a
+            `refresh_token`, or an error response.
+    """
+    #
+    # Read the refresh token from the event body.
+    #
+    body = request.body
+
+    if "refresh_token" not in body:
+        return api_utils.error(400, "missing refresh_token in body")
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
+        userid, refresh_token = refresh_tokens.rotate(
+            db_conn, body["refresh_token"], runtime.SECRET, runtime.REFRESH_TOKEN_DAYS
+        )
+
+    if userid is None:
+        return api_utils.error(401, "invalid refresh token")
+
+    token = auth.generate_token(userid, runtime.SECRET)
+
+    #
+    # Respond in an HTTP-like way, i.e. with a status
+    # code and body in JSON format.
+    #
+    print("**DONE, returning tokens**")
+    return api_utils.success(
+        200, {"access_token": token, "refresh_token": refresh_token}
+    )
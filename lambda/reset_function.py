@@ -3,78 +3,60 @@
 Resets the budget app to its default state by deleting all users and all information.
 """
 
-import os
+from utils import datatier, api_utils, runtime, usercache
 
-from configparser import ConfigParser
-from utils import datatier, api_utils
 
-
-def lambda_handler(event, context):
+@runtime.handler("Reset")
+def lambda_handler(request: runtime.Request):
     """Clears all tables and resets them to their empty state.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing success or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Reset**")
-
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
-
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
         #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
-
-        #
-        # Delete all rows from tables.
+        # Delete all rows from tables. Foreign key checks are a session
+        # setting, so they are turned back on even if a statement fails.
         #
         print("**Deleting budget categories**")
         sql = "SET FOREIGN_KEY_CHECKS = 0;"
         datatier.perform_action(db_conn, sql)
 
-        sql = "TRUNCATE TABLE categories;"
-        datatier.perform_action(db_conn, sql)
+        try:
+            print("**Deleting refresh tokens**")
+            sql = "TRUNCATE TABLE refreshtokens;"
+            datatier.perform_action(db_conn, sql)
 
-        print("**Deleting users**")
-        sql = "TRUNCATE TABLE users;"
-        datatier.perform_action(db_conn, sql)
+            sql = "TRUNCATE TABLE revokedtokens;"
+            datatier.perform_action(db_conn, sql)
 
-        print("**Deleting transactions**")
-        sql = "TRUNCATE TABLE transactions"
-        datatier.perform_action(db_conn, sql)
+            sql = "TRUNCATE TABLE categories;"
+            datatier.perform_action(db_conn, sql)
 
-        print("**Deleting recurring payments**")
-        sql = "TRUNCATE TABLE recurringpayments;"
-        datatier.perform_action(db_conn, sql)
+            print("**Deleting users**")
+            sql = "TRUNCATE TABLE users;"
+            datatier.perform_action(db_conn, sql)
 
-        sql = "SET FOREIGN_KEY_CHECKS = 1;"
-        datatier.perform_action(db_conn, sql)
+            print("**Deleting transactions**")
+            sql = "TRUNCATE TABLE transactions"
+            datatier.perform_action(db_conn, sql)
+
+            print("**Deleting recurring payments**")
+            sql = "TRUNCATE TABLE recurringpayments;"
+            datatier.perform_action(db_conn, sql)
+
+            sql = "TRUNCATE TABLE monthly_rollups;"
+            datatier.perform_action(db_conn, sql)
+        finally:
+            sql = "SET FOREIGN_KEY_CHECKS = 1;"
+            datatier.perform_action(db_conn, sql)
 
         sql = "ALTER TABLE users AUTO_INCREMENT = 80001;"
         datatier.perform_action(db_conn, sql)
@@ -88,15 +70,18 @@ def lambda_handler(event, context):
         sql = "ALTER TABLE recurringpayments AUTO_INCREMENT = 1;"
         datatier.perform_action(db_conn, sql)
 
+        sql = "ALTER TABLE refreshtokens AUTO_INCREMENT = 1;"
+        datatier.perform_action(db_conn, sql)
+
+        #
+        # Forget the users this container knew about. Containers that did not
+        # serve this request forget them when their cache entries expire.
+        #
+        usercache.invalidate()
+
         #
         # Respond in an HTTP-like way, i.e. with a status
         # code and body in JSON format.
         #
         print("**DONE, returning success**")
         return api_utils.success(200, {"success": 0})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
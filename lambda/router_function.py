@@ -0,0 +1,120 @@
+"""Handles every API request from a single Lambda function.
+
+This dispatches each event to the handler of the matching route, so one warm
+container serves the whole API and shares its connection pools and caches.
+The per-route functions can still be deployed separately.
+
+This file contains the following functions:
+
+    * match_route - finds the handler and path parameters for a request
+    * lambda_handler - dispatches an event to the matching handler
+"""
+
+import auth_function
+import create_budget_cat_function
+import create_recurring_function
+import create_trans_function
+import delete_function
+import logout_function
+import overview_function
+import query_function
+import refresh_function
+import reset_function
+import update_budget_cat_function
+import update_trans_function
+import users_function
+
+from utils import api_utils
+
+#
+# Maps each API Gateway resource to the handler for each of its methods. More
+# specific resources must come before the templated ones they overlap with.
+#
+ROUTES = {
+    "/auth": {"POST": auth_function.lambda_handler},
+    "/auth/refresh": {"POST": refresh_function.lambda_handler},
+    "/auth/logout": {"POST": logout_function.lambda_handler},
+    "/users": {
+        "GET": users_function.lambda_handler,
+        "POST": users_function.lambda_handler,
+    },
+    "/query/{args}": {"GET": query_function.lambda_handler},
+    "/overview": {"GET": overview_function.lambda_handler},
+    "/create/budget-category": {"POST": create_budget_cat_function.lambda_handler},
+    "/create/transaction": {"POST": create_trans_function.lambda_handler},
+    "/create/recurring-payment": {"POST": create_recurring_function.lambda_handler},
+    "/update/budget-category": {"POST": update_budget_cat_function.lambda_handler},
+    "/update/{args}": {"POST": update_trans_function.lambda_handler},
+    "/delete/{args}": {"DELETE": delete_function.lambda_handler},
+    "/reset": {"DELETE": reset_function.lambda_handler},
+}
+
+
+def match_route(resource: str | None, path: str | None):
+    """Finds the route for a request.
+
+    The API Gateway resource is used when it names a known route. Otherwise,
+    e.g. behind a `/{proxy+}` resource, the concrete path is matched against
+    each route in turn.
+
+    Args:
+        resource (str | None): The API Gateway resource template, if any.
+        path (str | None): The request path, e.g. `/query/transactions`.
+
+    Returns:
+        tuple[str, dict] | tuple[None, None]: The matching route and the path
+            parameters taken from the path, or (None, None) if nothing matches.
+    """
+    if resource in ROUTES:
+        return resource, None
+
+    if path is None:
+        return None, None
+
+    segments = path.strip("/").split("/")
+
+    for route in ROUTES:
+        route_segments = route.strip("/").split("/")
+
+        if len(route_segments) != len(segments):
+            continue
+
+        parameters = {}
+        for route_segment, segment in zip(route_segments, segments):
+            if route_segment.startswith("{") and route_segment.endswith("}"):
+                parameters[route_segment[1:-1]] = segment
+            elif route_segment != segment:
+                break
+        else:
+            return route, parameters
+
+    return None, None
+
+
+def lambda_handler(event, context):
+    """Dispatches an API Gateway event to the handler for its route.
+
+    Args:
+        event (dict): A JSON representation of the HTTP request.
+        context (lambda context object): Provides information about the invocation,
+            function, and runtime environment.
+
+    Returns:
+        dict: The response of the matching handler, or an error response if no
+            route matches.
+    """
+    route, parameters = match_route(event.get("resource"), event.get("path"))
+
+    if route is None:
+        return api_utils.error(404, "no such route")
+
+    handlers = ROUTES[route]
+    method = event.get("httpMethod")
+
+    if method not in handlers:
+        return api_utils.error(405, "method not allowed")
+
+    if parameters is not None:
+        event = dict(event, resource=route, pathParameters=parameters)
+
+    return handlers[method](event, context)
@@ -0,0 +1,238 @@
+"""Serves the API over HTTP from a self-hosted machine, without API Gateway.
+
+Each HTTP request is turned into the same event dict that API Gateway passes to
+the Lambda handlers, and dispatched through router_function on a bounded pool
+of worker threads. All workers share the datatier connection pools.
+
+Run from a directory containing lambda-config.ini:
+
+    python server.py --port 8080 --workers 16
+
+This file contains the following classes:
+
+    * RequestHandler - turns HTTP requests into Lambda events and back
+    * ThreadPoolHTTPServer - an HTTP server that handles connections on a
+      fixed number of worker threads
+
+This file contains the following functions:
+
+    * build_event - creates an API Gateway style event from an HTTP request
+    * serve_until_stopped - serves with a ThreadPoolHTTPServer until it stops
+    * serve - runs the server until it is interrupted or terminated
+"""
+
+import argparse
+import concurrent.futures
+import json
+import signal
+import socket
+import threading
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import router_function
+
+from utils import datatier
+
+#
+# How long, in seconds, a keep-alive connection may sit idle before its worker
+# thread closes it and moves on to another connection.
+#
+KEEP_ALIVE_TIMEOUT_SECONDS = 5
+
+
+def build_event(method: str, target: str, headers: dict, body: str | None):
+    """Creates an API Gateway style event from an HTTP request.
+
+    Args:
+        method (str): The HTTP method.
+        target (str): The request target, i.e. the path and query string.
+        headers (dict): The request headers.
+        body (str | None): The request body, if any.
+
+    Returns:
+        dict: A JSON representation of the HTTP request, as API Gateway sends it.
+    """
+    url = urllib.parse.urlsplit(target)
+    query = urllib.parse.parse_qs(url.query)
+
+    return {
+        "httpMethod": method,
+        "path": url.path,
+        "resource": None,
+        "pathParameters": None,
+        "queryStringParameters": (
+            {name: values[-1] for name, values in query.items()} if query else None
+        ),
+        "headers": headers,
+        "body": body,
+    }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Turns HTTP requests into Lambda events and writes back their responses."""
+
+    # HTTP/1.1 keeps connections open between requests unless the client
+    # asks otherwise.
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT_SECONDS
+
+    def handle_request(self):
+        """Dispatches the current request through the router."""
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else None
+        event = build_event(self.command, self.path, dict(self.headers), body)
+
+        try:
+            response = router_function.lambda_handler(event, None)
+        except Exception as err:
+            print("**ERROR**")
+            print(str(err))
+            response = {"statusCode": 500, "body": json.dumps({"message": str(err)})}
+
+        payload = (response.get("body") or "").encode("utf-8")
+
+        self.send_response(response["statusCode"])
+        for name, value in (response.get("headers") or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_PUT = handle_request
+    do_DELETE = handle_request
+
+    def log_message(self, format, *args):
+        """Prints one line per request in the same style as the handlers."""
+        print("**HTTP** " + (format % args))
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """An HTTP server that handles connections on a fixed pool of threads.
+
+    Unlike ThreadingHTTPServer, the number of threads never grows with load;
+    connections beyond the worker count wait in the executor's queue.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int] | None,
+        workers: int,
+        handler_class: type[BaseHTTPRequestHandler] = RequestHandler,
+        listener: socket.socket | None = None,
+    ):
+        """Binds the server, or adopts a listening socket, and starts its workers.
+
+        Args:
+            address (tuple[str, int] | None): The host and port to listen on,
+                or None when `listener` is given.
+            workers (int): The number of worker threads.
+            handler_class (type[BaseHTTPRequestHandler]): The class that handles
+                each connection. Defaults to RequestHandler.
+            listener (socket.socket | None): A listening socket shared with other
+                processes, which this server accepts from but never closes.
+                Defaults to None, i.e. bind `address` now.
+        """
+        if listener is None:
+            super().__init__(address, handler_class)
+        else:
+            super().__init__(listener.getsockname()[:2], handler_class, False)
+            self.socket.close()
+            self.socket = listener
+
+        self.shared_socket = listener is not None
+        self.workers = workers
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="budgetapp-worker"
+        )
+
+    def process_request(self, request, client_address):
+        """Hands a new connection to the worker pool."""
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        """Handles one connection on a worker thread, then closes it."""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def stop(self):
+        """Asks serve_forever() to return, from any thread, without waiting."""
+        # shutdown() blocks until serve_forever() returns, so it cannot run on
+        # the thread that is serving.
+        threading.Thread(target=self.shutdown).start()
+
+    def server_close(self):
+        """Stops accepting connections and waits for in-flight requests.
+
+        A shared listening socket stays open for the other processes.
+        """
+        if not self.shared_socket:
+            super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve_until_stopped(httpd: ThreadPoolHTTPServer):
+    """Serves with a ThreadPoolHTTPServer until its stop() is called.
+
+    Afterwards, in-flight requests finish and the pooled database connections
+    are closed.
+
+    Args:
+        httpd (ThreadPoolHTTPServer): The server to run.
+    """
+    # One connection per worker, so no request ever waits on the pool.
+    datatier.resize_pools(httpd.workers)
+
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        datatier.close_pools()
+
+
+def serve(host: str, port: int, workers: int):
+    """Runs the server until it receives SIGINT or SIGTERM.
+
+    On shutdown, the server stops accepting connections, lets in-flight
+    requests finish, and closes the pooled database connections.
+
+    Args:
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        workers (int): The number of worker threads.
+    """
+    httpd = ThreadPoolHTTPServer((host, port), workers)
+
+    def stop(signum, frame):
+        print("**Shutting down**")
+        httpd.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"**Serving on {host}:{port} with {workers} workers**")
+    serve_until_stopped(httpd)
+    print("**DONE**")
+
+
+def main():
+    """Parses the command line and runs the server."""
+    parser = argparse.ArgumentParser(description="Serve the budget app API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
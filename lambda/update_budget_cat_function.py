@@ -1,115 +1,92 @@
 """Handles the event that a `POST: /update/budget-category` request is received.
 
-This updates the total budget of a given category.
+This updates the total budget of a given category, or renames it.
 """
 
-import json
-import os
+from utils import datatier, api_utils, runtime, spending, money
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
 
+@runtime.handler("Update Budget Category", requires_body=True, requires_token=True)
+def lambda_handler(request: runtime.Request):
+    """Updates the total budget of a given category, or renames it.
 
-def lambda_handler(event, context):
-    """Updates the total budget of a given category.
+    Transactions and recurring payments refer to the category by its ID, so a
+    rename changes only the category's own row.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing `spent` or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Update Budget Category**")
+    #
+    # Read budget or new name from the event body.
+    #
+    userid = request.userid
+    body = request.body
 
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
+    if "category" not in body or ("budget" not in body and "new-name" not in body):
+        return api_utils.error(400, "missing category or new budget")
 
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
-
-        #
-        # Read the token from the event body.
-        #
-        print("**Accessing request headers**")
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
-
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
-
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
+    category = body["category"]
+    budget = None
 
+    if body.get("budget") is not None:
         try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
-
-        #
-        # Read budget from the event body.
-        #
-        if "body" not in event:
-            return api_utils.error(400, "no body in request")
-
-        body = json.loads(event["body"])
-
-        if "budget" not in body or "category" not in body:
-            return api_utils.error(400, "missing category or new budget")
-
-        budget = body["budget"]
-        category = body["category"]
-
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
-
+            budget = money.parse(body["budget"])
+        except ValueError as err:
+            return api_utils.error(400, "invalid budget: " + str(err))
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
         print("**Checking if userid is valid and getting current spent**")
-        sql = """
-        SELECT spent
-        FROM categories
-        WHERE userid = %s
-        AND category = %s
-        """
-        row = datatier.retrieve_one_row(db_conn, sql, [userid, category])
+        if "new-name" in body:
+            row, taken = spending.find_categories(
+                db_conn, userid, [category, body["new-name"]]
+            )
+
+            #
+            # The new name may find the category itself, e.g. when only its
+            # case changes, which is not a clash.
+            #
+            if row != () and taken != () and taken[0] != row[0]:
+                return api_utils.error(409, "category already exists")
+        else:
+            row = spending.find_category(db_conn, userid, category)
 
         if row == ():  # no such user
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
-        spent = row[0]
-
-        #
-        # Update category's totalbudget column.
-        #
-        query_1 = """
-        UPDATE categories
-        SET totalbudget = %s
-        WHERE userid = %s
-        AND category = %s;
-        """
-
-        datatier.perform_action(db_conn, query_1, [budget, userid, category])
+        categoryid, _, spent = row
+
+        with datatier.transaction(db_conn):
+            #
+            # Update category's totalbudget column.
+            #
+            if "budget" in body:
+                query_1 = """
+                UPDATE categories
+                SET totalbudget = %s
+                WHERE categoryid = %s;
+                """
+                datatier.execute_action(db_conn, query_1, [budget, categoryid])
+
+            #
+            # Rename the category.
+            #
+            if "new-name" in body:
+                query_2 = """
+                UPDATE categories
+                SET category = %s
+                WHERE categoryid = %s;
+                """
+                datatier.execute_action(
+                    db_conn, query_2, [body["new-name"], categoryid]
+                )
 
         #
         # Respond in an HTTP-like way, i.e. with a status
@@ -117,9 +94,3 @@ def lambda_handler(event, context):
         #
         print("**DONE, returning sum and top three transactions**")
         return api_utils.success(200, {"spent": spent})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
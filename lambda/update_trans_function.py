@@ -3,149 +3,91 @@
 This updates the specified transaction or recurring payment.
 """
 
-import json
-import os
+from utils import datatier, api_utils, runtime, spending, usercache, money
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
 
-
-def lambda_handler(event, context):
+@runtime.handler(
+    "Update Transaction/Recurring Payment", requires_body=True, requires_token=True
+)
+def lambda_handler(request: runtime.Request):
     """Updates the specified transaction.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing `id` or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Update Transaction/Recurring Payment**")
-
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
-
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        secret = configur.get("secret", "key")
-
-        #
-        # Read the token from the event headers.
-        #
-        print("**Accessing request headers**")
-        if "headers" not in event:
-            return api_utils.error(400, "no headers in request")
-
-        headers = event["headers"]
-        token: str = auth.get_token_from_header(headers)  # type: ignore
-
-        if token is None:
-            api_utils.error(401, "no bearer token in headers")
-
+    #
+    # Find out what we're updating.
+    #
+    userid = request.userid
+    body = request.body
+
+    if "updating" not in body:
+        return api_utils.error(400, "not specified what to update")
+
+    table = body["table"]
+    updating = body["updating"]
+    trans_id = body["id"]
+    new_info = ""
+    column = ""
+
+    # The table and column names are spliced into the UPDATE below, so only
+    # known ones may get that far.
+    if table not in ["transactions", "recurringpayments"]:
+        return api_utils.error(400, "invalid update type")
+
+    if updating not in [
+        "name",
+        "paymentname",
+        "cost",
+        "category",
+        "transactiondate",
+        "duedate",
+    ]:
+        return api_utils.error(400, "invalid column to update")
+
+    if table == "transactions":
+        column = "transactionid"
+    else:
+        column = "paymentid"
+
+    if "new-name" in body:
+        new_info = body["new-name"]
+    elif "new-cost" in body:
         try:
-            userid = auth.get_user_from_token(token, secret)
-        except Exception as _:
-            return api_utils.error(401, "invalid access token: " + token)
-
-        #
-        # Find out what we're updating.
-        #
-        if "body" not in event:
-            return api_utils.error(400, "no body in request")
-
-        body = json.loads(event["body"])
-
-        if "updating" not in body:
-            return api_utils.error(400, "not specified what to update")
-
-        table = body["table"]
-        updating = body["updating"]
-        trans_id = body["id"]
-        old_info = ""
-        new_info = ""
-        cost_category = ""
-        cost = ""
-        column = ""
-
-        if table == "transactions":
-            column = "transactionid"
-        else:
-            column = "paymentid"
-
-        if "new-name" in body:
-            new_info = body["new-name"]
-        elif "new-cost" in body:
-            old_info = body["old-cost"]
-            new_info = body["new-cost"]
-            cost_category = body["category"]
-        elif "new-category" in body:
-            old_info = body["old-category"]
-            new_info = body["new-category"]
-            cost = body["cost"]
-        elif "new-date" in body:
-            new_info = body["new-date"]
-        else:
-            return api_utils.error(400, "no column given to update")
-
+            new_info = money.parse(body["new-cost"])
+        except ValueError as err:
+            return api_utils.error(400, "invalid cost: " + str(err))
+    elif "new-category" in body:
+        new_info = body["new-category"]
+    elif "new-date" in body:
+        new_info = body["new-date"]
+    else:
+        return api_utils.error(400, "no column given to update")
+
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn() as db_conn:
         #
-        # Open connection to the database.
+        # Rows refer to their category by ID, so a new category is stored as
+        # its ID. The category belongs to the user, so finding it also shows
+        # that the user exists.
         #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
+        print("**Checking if userid is valid**")
+        if updating == "category":
+            row = spending.find_category(db_conn, userid, new_info)
 
-        print("**Checking if userid is valid and getting current spent**")
-        row = ""
-        row2 = ""
+            if row == ():  # no such user or category
+                print("**No such user or category, returning...**")
+                return api_utils.error(404, "no such user or category")
 
-        if updating == "category":
-            sql1 = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
-            """
-            sql2 = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
-            """
-            row = datatier.retrieve_one_row(db_conn, sql1, [userid, old_info])
-            row2 = datatier.retrieve_one_row(db_conn, sql2, [userid, new_info])
-        elif updating == "cost":
-            sql = """
-            SELECT spent
-            FROM categories
-            WHERE userid = %s
-            AND category = %s
-            """
-            row = datatier.retrieve_one_row(db_conn, sql, [userid, cost_category])
-        else:
-            sql = """
-            SELECT *
-            FROM categories
-            WHERE userid = %s
-            """
-            row = datatier.retrieve_one_row(db_conn, sql, [userid])
-
-        if row == ():  # no such user
+            updating = "categoryid"
+            new_info = row[0]
+        elif not usercache.user_exists(db_conn, userid):
             print("**No such user, returning...**")
             return api_utils.error(404, "no such user")
 
@@ -155,42 +97,35 @@ def lambda_handler(event, context):
         query_1 = """
         UPDATE """ + table + """
         SET """ + updating +""" = %s
-        WHERE """ + column + """ = %s;
+        WHERE """ + column + """ = %s
+        AND userid = %s;
         """
 
-        datatier.perform_action(db_conn, query_1, [new_info, trans_id])
-
-        if updating == "category" and table != "recurringpayments":
-            old_cat_spent = row[0]
-            new_cat_spent = row2[0]
-
-            old_cat_spent -= cost
-            new_cat_spent += cost
-
-            query_2 = """
-            UPDATE categories
-            SET spent = %s
-            WHERE category = %s;
-            """
-            query_3 = """
-            UPDATE categories
-            SET spent = %s
-            WHERE category = %s;
-            """
+        #
+        # The position of each accounted column in spending.lock_transaction()
+        # rows.
+        #
+        accounted = {"categoryid": 0, "transactiondate": 1, "cost": 2}
 
-            datatier.perform_action(db_conn, query_2, [old_cat_spent, old_info])
-            datatier.perform_action(db_conn, query_3, [new_cat_spent, new_info])
+        with datatier.transaction(db_conn):
+            #
+            # A transaction's category, date and cost are what its category's
+            # spent and monthly rollup are made of, so read them as stored
+            # before changing any of them.
+            #
+            current = ()
+            if table == "transactions" and updating in accounted:
+                current = spending.lock_transaction(db_conn, userid, trans_id)
 
-        if updating == "cost" and table != "recurringpayments":
-            updated_spent = float(row[0]) - float(old_info) + float(new_info)
+                if current == ():
+                    return api_utils.error(404, "no such transaction")
 
-            query_4 = """
-            UPDATE categories
-            SET spent = %s
-            WHERE category = %s;
-            """
+            datatier.execute_action(db_conn, query_1, [new_info, trans_id, userid])
 
-            datatier.perform_action(db_conn, query_4, [updated_spent, cost_category])
+            if current != ():
+                changed = list(current)
+                changed[accounted[updating]] = new_info
+                spending.apply(db_conn, userid, [current], [tuple(changed)])
 
         #
         # Respond in an HTTP-like way, i.e. with a status
@@ -198,9 +133,3 @@ def lambda_handler(event, context):
         #
         print("**DONE, returning sum and top three transactions**")
         return api_utils.success(200, {"id": trans_id})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
@@ -3,83 +3,49 @@
 This either returns all users in the database or creates a new user.
 """
 
-import json
-import os
+from utils import datatier, auth, api_utils, runtime, usercache
 
-from configparser import ConfigParser
-from utils import datatier, auth, api_utils
 
-
-def lambda_handler(event, context):
+@runtime.handler("Users")
+def lambda_handler(request: runtime.Request):
     """Returns all users in the database, or creates a new user.
 
     Args:
-        event (dict): A JSON representation of the HTTP request.
-        context (lambda context object): Provides information about the invocation,
-            function, and runtime environment.
+        request (runtime.Request): The parsed HTTP request.
 
     Returns:
         dict: The success response containing `rows` or `userid` or an error response.
     """
-    try:
-        print("**STARTING**")
-        print("**Lambda: Users**")
-
-        #
-        # Setup AWS based on config file.
-        #
-        config_file = "lambda-config.ini"
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = config_file
-
-        configur = ConfigParser()
-        configur.read(config_file)
-
-        #
-        # Configure for RDS access.
-        #
-        rds_endpoint = configur.get("rds", "endpoint")
-        rds_portnum = int(configur.get("rds", "port_number"))
-        rds_username = configur.get("rds", "user_name")
-        rds_pwd = configur.get("rds", "user_pwd")
-        rds_dbname = configur.get("rds", "db_name")
-        method = event["httpMethod"]
-
-        #
-        # Open connection to the database.
-        #
-        print("**Opening connection**")
-        db_conn = datatier.get_db_conn(
-            rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname
-        )
-
-        if method == "GET":
+    #
+    # Open connection to the database.
+    #
+    print("**Opening connection**")
+    with request.db_conn(read_only=request.method == "GET") as db_conn:
+        if request.method == "GET":
             #
             # Retrieve all the users.
             #
             print("**Retrieving data**")
             sql = "SELECT * FROM users ORDER BY userid;"
-            rows = datatier.retrieve_all_rows(db_conn, sql)
-
-            for row in rows:
-                print(row)
+            rows = datatier.stream_rows(db_conn, sql)
 
             #
             # Respond in an HTTP-like way, i.e. with a status
             # code and body in JSON format.
             #
             print("**DONE, returning rows**")
-            return api_utils.success(200, {"rows": rows})
+            return api_utils.success_rows(200, rows)
 
-        if method == "POST":
+        if request.method == "POST":
             #
             # Read the username and password from the event body
             #
             print("**Accessing request body**")
 
-            if "body" not in event:
+            if request.body is None:
                 return api_utils.error(400, "no body in request")
 
-            body = json.loads(event["body"])
+            body = request.body
 
             if "username" not in body or "password" not in body:
                 return api_utils.error(400, "missing credentials in body")
@@ -111,15 +77,12 @@ def lambda_handler(event, context):
             row = datatier.retrieve_one_row(db_conn, sql)
             userid = row[0]
 
+            # User IDs are reused after a reset, so drop any cached "no such user".
+            usercache.invalidate(userid)
+
             #
             # Respond in an HTTP-like way, i.e. with a status
             # code and body in JSON format.
             #
             print("**DONE, returning...**")
             return api_utils.success(200, {"userid": userid})
-
-    except Exception as err:
-        print("**ERROR**")
-        print(str(err))
-
-        return api_utils.error(500, str(err))
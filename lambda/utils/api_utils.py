@@ -10,12 +10,33 @@ Edited by:
 Functions:
 
     * success - creates a RESTful success response
+    * success_rows - creates a RESTful success response from an iterable of rows
     * error - creates an RESTful error response
+    * wants_read_your_writes - checks if a request must read from the primary
 """
 
+import datetime
+import decimal
+import io
 import json
 
 
+def _json_default(value):
+    """Serializes values that json does not handle natively, such as dates.
+
+    Amounts of money are Decimals with at most 12 digits. The shortest repr of
+    the float nearest such a value has the same digits, so clients that parse
+    with `parse_float=Decimal` get the exact amount back.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 def success(status_code: int, body: dict):
     """Creates a success response.
 
@@ -35,7 +56,43 @@ def success(status_code: int, body: dict):
 
     return {
         "statusCode": status_code,
-        "body": json.dumps(body),
+        "body": json.dumps(body, default=_json_default),
+    }
+
+
+def success_rows(status_code: int, rows, key: str = "rows"):
+    """Creates a success response whose body is `{key: [rows...]}`.
+
+    Rows are encoded one at a time as they are read, so a generator such as
+    datatier.stream_rows() is never materialized as a list alongside the body.
+
+    Args:
+        status_code (int): The response status code to return.
+        rows (Iterable[tuple]): The rows to return.
+        key (str): The body field that holds the rows. Defaults to "rows".
+
+    Returns:
+        dict: The success response.
+
+    Raises:
+        ValueError: An invalid status_code value was given.
+    """
+    if status_code < 200 or status_code >= 300:
+        raise ValueError("Only success status codes should be used (2XX).")
+
+    encoder = json.JSONEncoder(default=_json_default)
+    body = io.StringIO()
+
+    body.write("{" + encoder.encode(key) + ": [")
+    for i, row in enumerate(rows):
+        if i > 0:
+            body.write(", ")
+        body.write(encoder.encode(row))
+    body.write("]}")
+
+    return {
+        "statusCode": status_code,
+        "body": body.getvalue(),
     }
 
 
@@ -67,3 +124,24 @@ def error(status_code: int, message: str):
             }
         ),
     }
+
+
+def wants_read_your_writes(event: dict):
+    """Checks if a request opted in to reading its own latest writes.
+
+    Clients opt in by sending `X-Read-Your-Writes: true`. Such requests read from
+    the primary database instead of a replica that may be lagging behind.
+
+    Args:
+        event (dict): A JSON representation of the HTTP request.
+
+    Returns:
+        bool: True if reads must go to the primary, otherwise False.
+    """
+    headers = event.get("headers") or {}
+
+    for name, value in headers.items():
+        if name.lower() == "x-read-your-writes":
+            return str(value).lower() in ["1", "true", "yes"]
+
+    return False
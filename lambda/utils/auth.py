@@ -11,23 +11,65 @@ This file contains the following functions:
 
     * hash_password - creates a password hash using bcrypt
     * check_password - compares password str against a hash
+    * get_rounds - returns the cost a bcrypt hash was created with
+    * needs_rehash - checks whether a hash's cost should change to the configured one
+    * calibrate_rounds - picks the bcrypt cost that takes a target time to hash
+    * set_default_rounds - changes the cost hash_password uses by default
     * generate_token - creates an access token for a given user
     * get_token_from_header - returns token from authorization header
     * get_user_from_token - returns the user of a given token
+    * get_claims - returns every claim of a given token
+    * resize_token_cache - changes how many verified tokens are remembered
+    * clear_token_cache - forgets every verified token
+    * token_cache_stats - returns the token cache's hit and miss counters
 """
 
+import collections
 import datetime
+import secrets
+import threading
+import time
 
 import bcrypt
 import jwt
 
-
-def hash_password(password: str, salt_rounds: int = 12):
+#
+# The bcrypt cost used when none is configured, and the range that calibration
+# may choose from. Each step up doubles the time a hash takes.
+#
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+
+_default_rounds = BCRYPT_DEFAULT_ROUNDS
+_default_rounds_calibrated = False
+
+# A hash of a random password at the default cost, checked in place of the
+# stored hash of a user that does not exist.
+_dummy_hash = None
+_dummy_hash_lock = threading.Lock()
+
+#
+# Verified tokens are remembered until they expire, so a client that sends the
+# same token on every request is only verified once. The least recently used
+# token is forgotten when the cache is full.
+#
+TOKEN_CACHE_MAX_SIZE = 1024
+
+_token_cache = collections.OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_max_size = TOKEN_CACHE_MAX_SIZE
+_token_cache_hits = 0
+_token_cache_misses = 0
+
+
+def hash_password(password: str, salt_rounds: int | None = None):
     """Hashes a password.
 
     Args:
         password (str): The password to hash.
-        salt_rounds (int): The number of rounds of hashing to apply. Defaults to 12.
+        salt_rounds (int | None): The number of rounds of hashing to apply.
+            Defaults to the cost set with set_default_rounds(), initially 12.
 
     Returns:
         str: The hashed password.
@@ -38,25 +80,162 @@ def hash_password(password: str, salt_rounds: int = 12):
     if len(password) > 72:
         raise ValueError("Password must be less than 72 characters.")
 
+    if salt_rounds is None:
+        salt_rounds = _default_rounds
+
     salt = bcrypt.gensalt(salt_rounds)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
 
     return hashed.decode("utf-8")
 
 
-def check_password(password: str, hashed: str):
+def check_password(password: str, hashed: str | None):
     """Checks a password against a hash.
 
+    When there is no hash, e.g. because no such user exists, the password is
+    checked against a dummy hash of the default cost instead, so that the call
+    takes as long as a real check and does not reveal which users exist.
+
     Args:
         password (str): The password to check.
-        hashed (str): The hash to check against.
+        hashed (str | None): The hash to check against, or None.
 
     Returns:
         bool: True if the password is correct, False otherwise.
     """
+    if hashed is None:
+        bcrypt.checkpw(password.encode("utf-8"), _get_dummy_hash().encode("utf-8"))
+        return False
+
     return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
 
 
+def _get_dummy_hash():
+    """Returns the dummy hash for check_password(), creating it on first use."""
+    global _dummy_hash
+
+    with _dummy_hash_lock:
+        if _dummy_hash is None:
+            _dummy_hash = hash_password(secrets.token_urlsafe(16))
+
+        return _dummy_hash
+
+
+def get_rounds(hashed: str):
+    """Gets the cost a bcrypt hash was created with.
+
+    Args:
+        hashed (str): A hash such as `$2b$12$...`.
+
+    Returns:
+        int: The number of rounds, e.g. 12.
+
+    Raises:
+        ValueError: The hash is not a bcrypt hash.
+    """
+    parts = hashed.split("$")
+
+    if len(parts) < 4 or not parts[2].isdigit():
+        raise ValueError("Not a bcrypt hash.")
+
+    return int(parts[2])
+
+
+def needs_rehash(hashed: str, salt_rounds: int | None = None):
+    """Checks whether a hash should be recreated with the configured cost.
+
+    Call after check_password() succeeds, while the plain password is at hand,
+    and store hash_password(password) if this returns True.
+
+    A fixed cost is enforced both ways, so lowering it also makes logins
+    cheaper. A cost calibrated on this host is only a lower bound: hashes with
+    a higher cost are kept, so hosts whose calibrated costs differ by a round
+    do not rewrite each other's hashes on every login.
+
+    Args:
+        hashed (str): The stored hash.
+        salt_rounds (int | None): The cost hashes should have, exactly. Defaults
+            to the cost set with set_default_rounds().
+
+    Returns:
+        bool: True if the password should be hashed again, False otherwise.
+    """
+    calibrated = False
+    if salt_rounds is None:
+        salt_rounds = _default_rounds
+        calibrated = _default_rounds_calibrated
+
+    try:
+        rounds = get_rounds(hashed)
+    except ValueError:
+        return True
+
+    if calibrated:
+        return rounds < salt_rounds
+
+    return rounds != salt_rounds
+
+
+def calibrate_rounds(
+    target_seconds: float,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+):
+    """Picks the highest bcrypt cost that hashes within a target time here.
+
+    Times one hash at `min_rounds` and doubles that estimate for each further
+    round, so calibration itself costs about one hash at the lowest cost.
+
+    Args:
+        target_seconds (float): The longest a single hash should take.
+        min_rounds (int): The lowest cost to return, however slow the host.
+            Defaults to BCRYPT_MIN_ROUNDS.
+        max_rounds (int): The highest cost to return. Defaults to
+            BCRYPT_MAX_ROUNDS.
+
+    Returns:
+        int: The number of rounds to use.
+    """
+    salt = bcrypt.gensalt(min_rounds)
+
+    # Take the faster of two runs, so a one-off stall does not skew the result.
+    elapsed = float("inf")
+    for _ in range(2):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        elapsed = min(elapsed, time.perf_counter() - started)
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        elapsed *= 2
+        rounds += 1
+
+    return rounds
+
+
+def set_default_rounds(salt_rounds: int, calibrated: bool = False):
+    """Changes the cost hash_password() and needs_rehash() use by default.
+
+    Args:
+        salt_rounds (int): The number of rounds of hashing to apply.
+        calibrated (bool): Whether the cost came from calibrate_rounds(), in
+            which case needs_rehash() keeps hashes with a higher cost. Defaults
+            to False.
+
+    Raises:
+        ValueError: salt_rounds is outside the range bcrypt supports.
+    """
+    global _default_rounds, _default_rounds_calibrated, _dummy_hash
+
+    if not 4 <= salt_rounds <= 31:
+        raise ValueError("salt_rounds must be between 4 and 31.")
+
+    with _dummy_hash_lock:
+        _default_rounds = salt_rounds
+        _default_rounds_calibrated = calibrated
+        _dummy_hash = None
+
+
 def generate_token(user_id: str, secret: str, exp_minutes: int = 60):
     """Generates an access token for a user.
 
@@ -74,6 +253,8 @@ def generate_token(user_id: str, secret: str, exp_minutes: int = 60):
             "user_id": user_id,
             "exp": datetime.datetime.now(datetime.UTC)
             + datetime.timedelta(minutes=exp_minutes),
+            # A unique ID, so that this token can be revoked on its own.
+            "jti": secrets.token_hex(16),
         },
         secret,
         algorithm="HS256",
@@ -100,17 +281,119 @@ def get_token_from_header(headers: dict):
     return auth_header[7:]
 
 
-def get_user_from_token(token: str, secret: str):
+def get_user_from_token(token: str, secret: str, is_revoked=None):
     """Verifies an access token and gets a user's ID from it.
 
     An [exception](https://pyjwt.readthedocs.io/en/stable/api.html#exceptions)
-    will be raised if the token is invalid.
+    will be raised if the token is invalid. Tokens that verify are cached until
+    they expire, so repeated calls with the same token and secret are cheap.
+    Revocation is checked on every call, cached or not.
 
     Args:
         token (str): The access token.
         secret (str): The secret key to decrypt the token with.
+        is_revoked (Callable[[str], bool] | None): Checks whether a token ID has
+            been revoked, e.g. revocation.is_revoked. Defaults to None, i.e. no
+            revocation check.
 
     Returns:
         str: The user's unique ID.
+
+    Raises:
+        jwt.InvalidTokenError: The token is invalid or has been revoked.
+    """
+    global _token_cache_hits, _token_cache_misses
+
+    key = (secret, token)
+    entry = None
+
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+
+        if entry is not None:
+            if entry[1] > time.time():
+                _token_cache.move_to_end(key)
+                _token_cache_hits += 1
+            else:
+                del _token_cache[key]
+                entry = None
+
+        if entry is None:
+            _token_cache_misses += 1
+
+    if entry is None:
+        payload = jwt.decode(token, secret, algorithms=["HS256"])
+        entry = (payload["user_id"], payload.get("exp"), payload.get("jti"))
+
+        # Tokens without an expiry could never be evicted on time; skip them.
+        if entry[1] is not None:
+            with _token_cache_lock:
+                _token_cache[key] = entry
+                _token_cache.move_to_end(key)
+
+                while len(_token_cache) > _token_cache_max_size:
+                    _token_cache.popitem(last=False)
+
+    user_id, _, jti = entry
+
+    if is_revoked is not None and jti is not None and is_revoked(jti):
+        raise jwt.InvalidTokenError("Token has been revoked.")
+
+    return user_id
+
+
+def get_claims(token: str, secret: str):
+    """Verifies an access token and gets all of its claims.
+
+    Args:
+        token (str): The access token.
+        secret (str): The secret key to decrypt the token with.
+
+    Returns:
+        dict: The token's claims, e.g. `user_id`, `exp` and `jti`.
+
+    Raises:
+        jwt.InvalidTokenError: The token is invalid.
+    """
+    return jwt.decode(token, secret, algorithms=["HS256"])
+
+
+def resize_token_cache(max_size: int):
+    """Changes how many verified tokens get_user_from_token() remembers.
+
+    Args:
+        max_size (int): The most tokens to remember, or 0 to disable the cache.
+
+    Raises:
+        ValueError: max_size is negative.
+    """
+    global _token_cache_max_size
+
+    if max_size < 0:
+        raise ValueError("max_size must not be negative.")
+
+    with _token_cache_lock:
+        _token_cache_max_size = max_size
+
+        while len(_token_cache) > max_size:
+            _token_cache.popitem(last=False)
+
+
+def clear_token_cache():
+    """Forgets every verified token, e.g. after the secret is rotated."""
+    with _token_cache_lock:
+        _token_cache.clear()
+
+
+def token_cache_stats():
+    """Returns the token cache's counters.
+
+    Returns:
+        dict: `hits`, `misses` and the current `size` of the cache.
     """
-    return jwt.decode(token, secret, algorithms=["HS256"])["user_id"]
+    with _token_cache_lock:
+        return {
+            "hits": _token_cache_hits,
+            "misses": _token_cache_misses,
+            "size": len(_token_cache),
+        }
@@ -7,25 +7,383 @@ Original Author:
 Edited By:
     Lior Thornton
 
+This file contains the following classes:
+    * ConnectionPool: a bounded pool of reusable connections to one database
+
 This file contains the following functions:
+    * add_hook: registers a function that is told about every query
+    * remove_hook: unregisters a function added with add_hook
+    * fingerprint: normalizes SQL so that queries differing only in values match
     * get_dbConn: returns a connection object for MySQL database
+    * get_rds_settings: returns the connection settings for the primary or replica
+    * get_pool: returns the module-level pool for a given database and login
+    * acquire_db_conn: context manager that borrows a pooled connection
+    * close_pools: closes every pooled connection
+    * resize_pools: changes the size cap of every pool
     * retrieve_one_row: returns first row retrieved by a given query
     * retrieve_all_rows: returns all rows retrieved by a given query
+    * stream_rows: yields the rows retrieved by a given query a batch at a time
+    * retrieve_many: returns the rows of several queries sent in one round trip
+    * retrieve_parallel: returns the rows of several queries run at the same time
     * perform_action: executes an SQL action query
+    * execute_action: executes an SQL action query without committing
+    * transaction: context manager that commits a group of actions at once
+    * execute_batch: executes an SQL action query once per row, without committing
+    * perform_batch: executes an SQL action query once per row, in one commit
 """
 
+import concurrent.futures
+import contextlib
+import functools
+import os
+import re
+import threading
+import time
+
 import pymysql
 
+from pymysql.constants import CLIENT
+
+#
+# Pools live at module level so that warm Lambda containers reuse the
+# connections opened by previous invocations.
+#
+POOL_MAX_SIZE = 4
+POOL_MAX_IDLE_SECONDS = 300
+POOL_ACQUIRE_TIMEOUT_SECONDS = 10
+
+#
+# Rows sent per executemany() call. pymysql folds an INSERT ... VALUES batch
+# into one multi-row statement, so this keeps each statement well under the
+# server's max_allowed_packet.
+#
+BATCH_CHUNK_SIZE = 500
+
+#
+# Rows fetched per round trip by stream_rows().
+#
+STREAM_BATCH_SIZE = 500
+
+#
+# Threads shared by every retrieve_parallel() call in the process.
+#
+PARALLEL_MAX_WORKERS = 8
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pool_max_size = POOL_MAX_SIZE
+
+_parallel_executor = None
+
+_hooks = []
+
+_LITERAL = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b\d+(?:\.\d+)?\b|%s"
+)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ConnectionPool:
+    """A bounded pool of reusable connections to one MySQL database."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        portnum: int,
+        username: str,
+        pwd: str,
+        dbname: str,
+        max_size: int = POOL_MAX_SIZE,
+        max_idle_seconds: float = POOL_MAX_IDLE_SECONDS,
+        multi_statements: bool = False,
+    ):
+        """Creates an empty pool; connections are opened on demand.
+
+        Args:
+            endpoint (str): The machine name or IP address of server.
+            portnum (int): The server port number.
+            username (str): The user name for login.
+            pwd (str): The user password for login.
+            dbname (str): The database name.
+            max_size (int): The most connections, idle or in use, the pool will
+                hold open at once. Defaults to POOL_MAX_SIZE.
+            max_idle_seconds (float): How long a connection may sit unused before
+                it is closed. Defaults to POOL_MAX_IDLE_SECONDS.
+            multi_statements (bool): Whether the connections accept several
+                statements per query, for retrieve_many(). Defaults to False.
+        """
+        self.endpoint = endpoint
+        self.portnum = portnum
+        self.username = username
+        self.pwd = pwd
+        self.dbname = dbname
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.multi_statements = multi_statements
+
+        # Idle connections are kept as (connection, released at) pairs and handed
+        # out most recently used first, so the oldest ones are left to expire.
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = POOL_ACQUIRE_TIMEOUT_SECONDS):
+        """Borrows a live connection from the pool, opening one if needed.
+
+        Idle connections are pinged before they are handed out, and are replaced
+        if the server has dropped them.
+
+        Args:
+            timeout (float): How many seconds to wait for a connection when the
+                pool is at capacity. Defaults to POOL_ACQUIRE_TIMEOUT_SECONDS.
+
+        Returns:
+            Connection[Cursor]: A database connection object.
+
+        Raises:
+            TimeoutError: No connection became available in time.
+            Exception: Attempt to connect to database failed.
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            db_conn = None
+
+            with self._cond:
+                while True:
+                    self._evict_idle()
+
+                    if self._idle:
+                        db_conn, _ = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("datatier connection pool exhausted")
+                    self._cond.wait(remaining)
+
+            if db_conn is None:
+                try:
+                    return get_db_conn(
+                        self.endpoint,
+                        self.portnum,
+                        self.username,
+                        self.pwd,
+                        self.dbname,
+                        self.multi_statements,
+                    )
+                except Exception:
+                    self._forget()
+                    raise
+
+            try:
+                db_conn.ping(reconnect=False)
+                return db_conn
+            except Exception:
+                # The server closed this connection while it was idle; drop it and
+                # try again with another one.
+                self._discard(db_conn)
+
+    def release(self, db_conn, discard: bool = False):
+        """Returns a borrowed connection to the pool.
+
+        Args:
+            db_conn (Connection[Cursor]): The connection to return.
+            discard (bool): Close the connection instead of keeping it for reuse.
+                Defaults to False.
+        """
+        if discard or not db_conn.open:
+            self._discard(db_conn)
+            return
+
+        with self._cond:
+            self._idle.append((db_conn, time.monotonic()))
+            self._cond.notify()
+
+    def resize(self, max_size: int):
+        """Changes the most connections the pool will hold open at once.
+
+        Args:
+            max_size (int): The new cap.
+        """
+        with self._cond:
+            self.max_size = max_size
+            self._cond.notify_all()
+
+    def close(self):
+        """Closes every idle connection held by the pool."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for db_conn, _ in idle:
+            _close_quietly(db_conn)
+
+    def _evict_idle(self):
+        """Closes idle connections that have outlived max_idle_seconds.
+
+        The caller must hold the pool's lock.
+        """
+        cutoff = time.monotonic() - self.max_idle_seconds
+        expired = [conn for conn, released in self._idle if released < cutoff]
+
+        if expired:
+            self._idle = [(conn, at) for conn, at in self._idle if at >= cutoff]
+            self._size -= len(expired)
+            for db_conn in expired:
+                _close_quietly(db_conn)
+
+    def _discard(self, db_conn):
+        """Closes a connection that will not be returned to the pool."""
+        _close_quietly(db_conn)
+        self._forget()
+
+    def _forget(self):
+        """Frees the pool slot of a connection that is no longer open."""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+def add_hook(hook):
+    """Registers a function that is called after every datatier operation.
+
+    The hook receives one dict per operation with these keys:
+
+        * operation (str): the datatier function, e.g. "retrieve_one_row"
+        * fingerprint (str | None): fingerprint(sql), or None for get_db_conn
+        * connect_seconds (float): time spent opening a connection
+        * execute_seconds (float): time spent sending the query and committing
+        * fetch_seconds (float): time spent reading rows back
+        * rows (int): rows returned, or rows modified by an action
+        * failed (bool): whether the operation raised
+
+    Hooks run on the request path, so they should be quick. Errors raised by a
+    hook are printed and otherwise ignored.
+
+    Args:
+        hook (Callable[[dict], None]): The function to call.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregisters a function added with add_hook.
+
+    Args:
+        hook (Callable[[dict], None]): The function to stop calling.
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@functools.lru_cache(maxsize=256)
+def fingerprint(sql: str):
+    """Normalizes a SQL query so that queries differing only in values match.
+
+    Literals and %s placeholders become `?`, IN lists collapse to `(?+)`,
+    whitespace is squeezed and the text is lowercased.
+
+    Args:
+        sql (str): The SQL query.
+
+    Returns:
+        str: The query's fingerprint.
+    """
+    normalized = _LITERAL.sub("?", sql)
+    normalized = _IN_LIST.sub("(?+)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip().rstrip(";").strip()
+
+    return normalized.lower()
+
+
+class _Timer:
+    """Times one datatier operation and reports it to the registered hooks."""
+
+    def __init__(self, operation: str, sql: str | None):
+        self.operation = operation
+        self.sql = sql
+        self.rows = 0
+        self.failed = False
+        self.started = time.perf_counter()
+        self.executed_at = None
+
+    def executed(self):
+        """Marks the end of the execute phase and the start of the fetch phase."""
+        self.executed_at = time.perf_counter()
+
+    def finish(self):
+        """Reports the operation to every hook, if any are registered."""
+        if not _hooks:
+            return
+
+        finished = time.perf_counter()
+        executed_at = self.executed_at or finished
+
+        if self.sql is None:
+            connect, execute, fetch = finished - self.started, 0.0, 0.0
+        else:
+            connect = 0.0
+            execute = executed_at - self.started
+            fetch = finished - executed_at
+
+        event = {
+            "operation": self.operation,
+            "fingerprint": None if self.sql is None else fingerprint(self.sql),
+            "connect_seconds": connect,
+            "execute_seconds": execute,
+            "fetch_seconds": fetch,
+            "rows": self.rows,
+            "failed": self.failed,
+        }
+
+        for hook in list(_hooks):
+            try:
+                hook(event)
+            except Exception as err:
+                print("datatier hook failed:")
+                print(str(err))
+
+
+def _close_quietly(db_conn):
+    """Closes a connection, ignoring errors from an already broken socket."""
+    try:
+        db_conn.close()
+    except Exception:
+        pass
+
 
-def get_db_conn(endpoint: str, portnum: int, username: str, pwd: str, dbname: str):
+def get_db_conn(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
     """Opens and returns a connection object for interacting with a MySQL database.
 
+    The connection runs in autocommit mode, so a pooled connection never carries
+    an open read snapshot from one request into the next. Use `transaction` to
+    group several actions into one commit.
+
     Args:
         endpoint (str): The machine name or IP address of server.
         portnum (int): The server port number.
         username (str): The user name for login.
         pwd (str): The user password for login.
         dbname (str): The database name.
+        multi_statements (bool): Whether to accept several statements per query,
+            which only retrieve_many() needs. Leave it off for connections that
+            write, so a statement can never be stacked onto another. Defaults
+            to False.
 
     Returns:
         Connection[Cursor]: A database connection object.
@@ -33,16 +391,197 @@ def get_db_conn(endpoint: str, portnum: int, username: str, pwd: str, dbname: st
     Raises:
         Exception: Attempt to connect to database failed.
     """
+    timer = _Timer("get_db_conn", None)
+
     try:
         db_conn = pymysql.connect(
-            host=endpoint, port=portnum, user=username, passwd=pwd, database=dbname
+            host=endpoint,
+            port=portnum,
+            user=username,
+            passwd=pwd,
+            database=dbname,
+            autocommit=True,
+            client_flag=CLIENT.MULTI_STATEMENTS if multi_statements else 0,
         )
 
         return db_conn
     except Exception as err:
+        timer.failed = True
         print("datatier.get_dbConn() failed:")
         print(str(err))
         raise
+    finally:
+        timer.finish()
+
+
+def get_rds_settings(configur, read_only: bool = False):
+    """Reads the connection settings for the primary or the read endpoint.
+
+    Writes always use the `[rds]` section. Read-only work uses the `[rds-read]`
+    section, which can point at a read replica and the budgetapp-read-only
+    login, and falls back to `[rds]` when that section is absent. Each set of
+    settings gets its own pool.
+
+    Args:
+        configur (ConfigParser): The parsed lambda-config.ini file.
+        read_only (bool): Whether the caller only runs SELECT queries.
+            Defaults to False.
+
+    Returns:
+        tuple[str, int, str, str, str]: The endpoint, port number, user name,
+            password and database name, in acquire_db_conn() argument order.
+    """
+    section = "rds"
+    if read_only and configur.has_section("rds-read"):
+        section = "rds-read"
+
+    return (
+        configur.get(section, "endpoint"),
+        int(configur.get(section, "port_number")),
+        configur.get(section, "user_name"),
+        configur.get(section, "user_pwd"),
+        configur.get(section, "db_name"),
+    )
+
+
+def get_pool(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
+    """Returns the module-level pool for a database, creating it on first use.
+
+    Pools are keyed by endpoint, port, user name, database name and whether
+    multi-statement queries are on, so each distinct login gets its own set of
+    connections.
+
+    Args:
+        endpoint (str): The machine name or IP address of server.
+        portnum (int): The server port number.
+        username (str): The user name for login.
+        pwd (str): The user password for login.
+        dbname (str): The database name.
+        multi_statements (bool): Whether the connections accept several
+            statements per query. Defaults to False.
+
+    Returns:
+        ConnectionPool: The pool for the given database and login.
+    """
+    key = (endpoint, portnum, username, dbname, multi_statements)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+
+        if pool is None:
+            pool = ConnectionPool(
+                endpoint,
+                portnum,
+                username,
+                pwd,
+                dbname,
+                max_size=_pool_max_size,
+                multi_statements=multi_statements,
+            )
+            _pools[key] = pool
+
+        return pool
+
+
+@contextlib.contextmanager
+def acquire_db_conn(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
+    """Borrows a pooled connection for the duration of a `with` block.
+
+    The connection goes back to the pool when the block exits. If the block
+    raised, the connection is closed instead, which also rolls back any open
+    transaction, so no session state it was left in reaches a later request.
+
+    Args:
+        endpoint (str): The machine name or IP address of server.
+        portnum (int): The server port number.
+        username (str): The user name for login.
+        pwd (str): The user password for login.
+        dbname (str): The database name.
+        multi_statements (bool): Whether to borrow from the pool whose
+            connections accept several statements per query, as
+            retrieve_many() needs. Defaults to False.
+
+    Yields:
+        Connection[Cursor]: A database connection object.
+    """
+    pool = get_pool(endpoint, portnum, username, pwd, dbname, multi_statements)
+    db_conn = pool.acquire()
+    discard = False
+
+    try:
+        yield db_conn
+    except BaseException:
+        discard = True
+        raise
+    finally:
+        pool.release(db_conn, discard=discard)
+
+
+def close_pools():
+    """Closes the idle connections of every module-level pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    for pool in pools:
+        pool.close()
+
+
+def _forget_pools_after_fork():
+    """Drops the pools and threads inherited from a parent process.
+
+    A forked child shares its parent's sockets, so it must neither use nor close
+    the inherited connections; it opens its own on first use instead. The
+    parent's threads do not exist in the child at all.
+    """
+    global _pools, _pools_lock, _parallel_executor
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _parallel_executor = None
+
+
+os.register_at_fork(after_in_child=_forget_pools_after_fork)
+
+
+def resize_pools(max_size: int):
+    """Changes the size cap of every module-level pool, current and future.
+
+    Servers that handle several requests at once should size their pools to
+    match their worker count. Shrinking a pool does not close connections that
+    are in use; the pool simply stops opening new ones until it is under the
+    new cap.
+
+    Args:
+        max_size (int): The most connections each pool may hold open at once.
+
+    Raises:
+        ValueError: max_size is not positive.
+    """
+    global _pool_max_size
+
+    if max_size < 1:
+        raise ValueError("max_size must be at least 1.")
+
+    with _pools_lock:
+        _pool_max_size = max_size
+        pools = list(_pools.values())
+
+    for pool in pools:
+        pool.resize(max_size)
 
 
 def retrieve_one_row(db_conn, sql, parameters: list[object] = []):
@@ -61,21 +600,26 @@ def retrieve_one_row(db_conn, sql, parameters: list[object] = []):
         Exception: Attempt to retrieve data failed.
     """
     db_cursor = db_conn.cursor()
+    timer = _Timer("retrieve_one_row", sql)
 
     try:
         db_cursor.execute(sql, parameters)
+        timer.executed()
         row: tuple = db_cursor.fetchone()
         # If row is none, the query was successfully executed but no data was retrieved.
         if row is None:
             return ()
         else:
+            timer.rows = 1
             return row
     except Exception as err:
+        timer.failed = True
         print("datatier.retrieve_one_row() failed:")
         print(str(err))
         raise
     finally:
         db_cursor.close()
+        timer.finish()
 
 
 def retrieve_all_rows(db_conn, sql, parameters: list[object] = []):
@@ -95,21 +639,207 @@ def retrieve_all_rows(db_conn, sql, parameters: list[object] = []):
         Exception: Attempt to retrieve data failed.
     """
     db_cursor = db_conn.cursor()
+    timer = _Timer("retrieve_all_rows", sql)
 
     try:
         db_cursor.execute(sql, parameters)
+        timer.executed()
         rows = db_cursor.fetchall()
         # If row is none, the query was successfully executed but no data was retrieved.
         if rows is None:
             return ()
         else:
+            timer.rows = len(rows)
             return rows
     except Exception as err:
+        timer.failed = True
         print("datatier.retrieve_all_rows() failed:")
         print(str(err))
         raise
     finally:
         db_cursor.close()
+        timer.finish()
+
+
+def stream_rows(
+    db_conn, sql, parameters: list[object] = [], batch: int = STREAM_BATCH_SIZE
+):
+    """Executes a SQL SELECT query and yields its rows without buffering them all.
+
+    Uses an unbuffered server-side cursor, so at most `batch` rows are held in
+    memory at once. The connection cannot run another query until the generator
+    is exhausted or closed.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        sql (str): The SQL select query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+        batch (int): The number of rows fetched per round trip. Defaults to
+            STREAM_BATCH_SIZE.
+
+    Yields:
+        tuple: Each retrieved row, in order.
+
+    Raises:
+        Exception: Attempt to retrieve data failed.
+    """
+    db_cursor = db_conn.cursor(pymysql.cursors.SSCursor)
+    timer = _Timer("stream_rows", sql)
+
+    try:
+        db_cursor.execute(sql, parameters)
+        timer.executed()
+
+        while True:
+            rows = db_cursor.fetchmany(batch)
+            if not rows:
+                break
+            timer.rows += len(rows)
+            yield from rows
+    except Exception as err:
+        timer.failed = True
+        print("datatier.stream_rows() failed:")
+        print(str(err))
+        raise
+    finally:
+        # Closing an unbuffered cursor reads and discards any unread rows, which
+        # leaves the connection ready for its next query.
+        db_cursor.close()
+        timer.finish()
+
+
+def retrieve_many(db_conn, queries: list[tuple[str, list[object]]]):
+    """Executes several SQL SELECT queries in a single round trip.
+
+    The parameters of each query are escaped client-side and the queries are
+    sent together as one multi-statement request, so the connection must come
+    from acquire_db_conn(..., multi_statements=True).
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        queries (list[tuple[str, list[object]]]): (sql, parameters) pairs, where
+            each sql is a single SELECT that can be parameterized with %s.
+
+    Returns:
+        list[tuple]: One result per query, in order. Each result is a tuple of
+            rows, empty if that SELECT retrieves no data.
+
+    Raises:
+        ValueError: The connection does not accept multi-statement queries.
+        Exception: Attempt to retrieve data failed.
+    """
+    if not queries:
+        return []
+
+    if not db_conn.client_flag & CLIENT.MULTI_STATEMENTS:
+        raise ValueError("retrieve_many() needs a multi-statement connection")
+
+    db_cursor = db_conn.cursor()
+    timer = _Timer("retrieve_many", ";\n".join(sql for sql, _ in queries))
+
+    try:
+        statements = [
+            db_cursor.mogrify(sql, parameters).strip().rstrip(";")
+            for sql, parameters in queries
+        ]
+        db_cursor.execute(";\n".join(statements))
+        timer.executed()
+
+        results = [db_cursor.fetchall() or ()]
+        while db_cursor.nextset():
+            results.append(db_cursor.fetchall() or ())
+
+        timer.rows = sum(len(result) for result in results)
+        return results
+    except Exception as err:
+        timer.failed = True
+        print("datatier.retrieve_many() failed:")
+        print(str(err))
+        raise
+    finally:
+        db_cursor.close()
+        timer.finish()
+
+
+def _retrieve_borrowed(pool: ConnectionPool, sql, parameters: list[object]):
+    """Runs one query of retrieve_parallel() on a connection borrowed from pool.
+
+    Returns:
+        tuple | None: The rows retrieved, or None if the pool had no connection
+            to spare right away.
+    """
+    try:
+        db_conn = pool.acquire(timeout=0)
+    except Exception:
+        return None
+
+    discard = False
+
+    try:
+        return tuple(retrieve_all_rows(db_conn, sql, parameters))
+    except Exception:
+        discard = True
+        raise
+    finally:
+        pool.release(db_conn, discard=discard)
+
+
+def retrieve_parallel(
+    db_conn, settings: tuple, queries: list[tuple[str, list[object]]]
+):
+    """Executes independent SQL SELECT queries at the same time.
+
+    The first query runs on `db_conn`. Every other query runs on its own
+    connection, borrowed from the pool for `settings`, on a shared thread pool,
+    so the call takes about as long as the slowest query rather than the sum of
+    them. A query that finds the pool empty runs on `db_conn` afterwards
+    instead, so this never waits for a connection.
+
+    Args:
+        db_conn (Connection[Cursor]): The caller's database connection object.
+        settings (tuple): The connection settings `db_conn` was acquired with,
+            in acquire_db_conn() argument order.
+        queries (list[tuple[str, list[object]]]): (sql, parameters) pairs, where
+            each sql is a SELECT that does not depend on the others' results.
+
+    Returns:
+        list[tuple]: One result per query, in order. Each result is a tuple of
+            rows, empty if that SELECT retrieves no data.
+
+    Raises:
+        Exception: Attempt to retrieve data failed.
+    """
+    global _parallel_executor
+
+    if not queries:
+        return []
+
+    pool = get_pool(*settings)
+
+    with _pools_lock:
+        if _parallel_executor is None:
+            _parallel_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=PARALLEL_MAX_WORKERS,
+                thread_name_prefix="datatier-parallel",
+            )
+        executor = _parallel_executor
+
+    futures = [
+        executor.submit(_retrieve_borrowed, pool, sql, parameters)
+        for sql, parameters in queries[1:]
+    ]
+
+    sql, parameters = queries[0]
+    results = [tuple(retrieve_all_rows(db_conn, sql, parameters))]
+
+    for (sql, parameters), future in zip(queries[1:], futures):
+        rows = future.result()
+        if rows is None:
+            rows = tuple(retrieve_all_rows(db_conn, sql, parameters))
+        results.append(rows)
+
+    return results
 
 
 def perform_action(db_conn, sql, parameters: list[object] = []):
@@ -128,15 +858,164 @@ def perform_action(db_conn, sql, parameters: list[object] = []):
         Exception: Attempt to perform action failed.
     """
     db_cursor = db_conn.cursor()
+    timer = _Timer("perform_action", sql)
 
     try:
         db_cursor.execute(sql, parameters)
         db_conn.commit()
+        timer.executed()
+        timer.rows = db_cursor.rowcount
         return db_cursor.rowcount
     except Exception as err:
+        timer.failed = True
         db_conn.rollback()
         print("datatier.perform_action() failed:")
         print(str(err))
         raise
     finally:
         db_cursor.close()
+        timer.finish()
+
+
+def execute_action(db_conn, sql, parameters: list[object] = []):
+    """Executes a SQL ACTION query without committing it.
+
+    Use inside a `transaction` block so that several actions are committed, or
+    rolled back, together.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        sql (str): The SQL ACTION query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+
+    Returns:
+        int: The number of rows modified.
+
+    Raises:
+        Exception: Attempt to perform action failed.
+    """
+    db_cursor = db_conn.cursor()
+    timer = _Timer("execute_action", sql)
+
+    try:
+        db_cursor.execute(sql, parameters)
+        timer.executed()
+        timer.rows = db_cursor.rowcount
+        return db_cursor.rowcount
+    except Exception as err:
+        timer.failed = True
+        print("datatier.execute_action() failed:")
+        print(str(err))
+        raise
+    finally:
+        db_cursor.close()
+        timer.finish()
+
+
+@contextlib.contextmanager
+def transaction(db_conn):
+    """Groups the actions run in a `with` block into one atomic transaction.
+
+    The transaction is committed once when the block exits, or rolled back if
+    the block raised.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+
+    Yields:
+        Connection[Cursor]: The same connection, for use with execute_action.
+
+    Raises:
+        Exception: Attempt to commit the transaction failed.
+    """
+    db_conn.begin()
+
+    try:
+        yield db_conn
+        db_conn.commit()
+    except BaseException:
+        try:
+            db_conn.rollback()
+        except Exception as err:
+            print("datatier.transaction() rollback failed:")
+            print(str(err))
+        raise
+
+
+def execute_batch(
+    db_conn,
+    sql,
+    rows: list[list[object]],
+    chunk_size: int = BATCH_CHUNK_SIZE,
+):
+    """Executes a SQL ACTION query once per row of parameters, without committing.
+
+    Rows are sent chunk_size at a time with executemany(), which pymysql turns
+    into a single multi-row statement for `INSERT ... VALUES (...)` queries.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        sql (str): The SQL ACTION query, parameterized with %s.
+        rows (list[list[object]]): One list of parameter values per execution.
+        chunk_size (int): The most rows sent in one round trip. Defaults to
+            BATCH_CHUNK_SIZE.
+
+    Returns:
+        list[int]: The number of rows modified by each chunk, in order.
+
+    Raises:
+        ValueError: chunk_size is not positive.
+        Exception: Attempt to perform action failed.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+
+    db_cursor = db_conn.cursor()
+    timer = _Timer("execute_batch", sql)
+    counts = []
+
+    try:
+        for start in range(0, len(rows), chunk_size):
+            db_cursor.executemany(sql, rows[start : start + chunk_size])
+            counts.append(db_cursor.rowcount)
+
+        timer.executed()
+        timer.rows = sum(counts)
+        return counts
+    except Exception as err:
+        timer.failed = True
+        print("datatier.execute_batch() failed:")
+        print(str(err))
+        raise
+    finally:
+        db_cursor.close()
+        timer.finish()
+
+
+def perform_batch(
+    db_conn,
+    sql,
+    rows: list[list[object]],
+    chunk_size: int = BATCH_CHUNK_SIZE,
+):
+    """Executes a SQL ACTION query once per row of parameters, in one commit.
+
+    Either every row is applied or, if any chunk fails, none are.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        sql (str): The SQL ACTION query, parameterized with %s.
+        rows (list[list[object]]): One list of parameter values per execution.
+        chunk_size (int): The most rows sent in one round trip. Defaults to
+            BATCH_CHUNK_SIZE.
+
+    Returns:
+        list[int]: The number of rows modified by each chunk, in order.
+
+    Raises:
+        ValueError: chunk_size is not positive.
+        Exception: Attempt to perform action failed.
+    """
+    with transaction(db_conn):
+        return execute_batch(db_conn, sql, rows, chunk_size)
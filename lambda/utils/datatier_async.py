@@ -0,0 +1,434 @@
+"""Executes SQL queries against a MySQL database from asyncio code.
+
+This mirrors the datatier API with coroutines built on aiomysql, so that one
+event loop can keep many queries in flight while it waits on the database.
+Connections behave as in datatier: autocommit is on, multi-statement queries
+are only enabled on request, and every operation is reported to the datatier
+hooks.
+
+Only the asyncio server imports this file; the Lambda handlers keep using
+datatier.
+
+This file contains the following functions:
+    * get_db_conn: opens a connection object for MySQL database
+    * get_pool: returns the pool for a given database and login
+    * acquire_db_conn: async context manager that borrows a pooled connection
+    * close_pools: closes every pooled connection
+    * resize_pools: sets the size cap of pools created from now on
+    * retrieve_one_row: returns first row retrieved by a given query
+    * retrieve_all_rows: returns all rows retrieved by a given query
+    * retrieve_many: returns the rows of several queries sent in one round trip
+    * perform_action: executes an SQL action query
+    * execute_action: executes an SQL action query without committing
+    * transaction: async context manager that commits a group of actions at once
+"""
+
+import asyncio
+import contextlib
+
+import aiomysql
+
+from pymysql.constants import CLIENT
+
+from utils import datatier
+
+#
+# An async pool is cheap to hold open, since a waiting query costs a coroutine
+# rather than a thread. The server sizes it to its concurrency limit.
+#
+POOL_MAX_SIZE = 32
+POOL_MAX_IDLE_SECONDS = datatier.POOL_MAX_IDLE_SECONDS
+
+_pools = {}
+_pools_lock = asyncio.Lock()
+_pool_max_size = POOL_MAX_SIZE
+
+
+async def get_db_conn(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
+    """Opens and returns a connection object for interacting with a MySQL database.
+
+    Args:
+        endpoint (str): The machine name or IP address of server.
+        portnum (int): The server port number.
+        username (str): The user name for login.
+        pwd (str): The user password for login.
+        dbname (str): The database name.
+        multi_statements (bool): Whether to accept several statements per query,
+            which only retrieve_many() needs. Defaults to False.
+
+    Returns:
+        aiomysql.Connection: A database connection object.
+
+    Raises:
+        Exception: Attempt to connect to database failed.
+    """
+    timer = datatier._Timer("get_db_conn", None)
+
+    try:
+        return await aiomysql.connect(
+            host=endpoint,
+            port=portnum,
+            user=username,
+            password=pwd,
+            db=dbname,
+            autocommit=True,
+            client_flag=CLIENT.MULTI_STATEMENTS if multi_statements else 0,
+        )
+    except Exception as err:
+        timer.failed = True
+        print("datatier_async.get_db_conn() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+async def get_pool(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
+    """Returns the pool for a database, creating it on first use.
+
+    Pools are keyed the same way as in datatier, and belong to the event loop
+    that created them.
+
+    Args:
+        endpoint (str): The machine name or IP address of server.
+        portnum (int): The server port number.
+        username (str): The user name for login.
+        pwd (str): The user password for login.
+        dbname (str): The database name.
+        multi_statements (bool): Whether the connections accept several
+            statements per query. Defaults to False.
+
+    Returns:
+        aiomysql.Pool: The pool for the given database and login.
+    """
+    key = (endpoint, portnum, username, dbname, multi_statements)
+
+    async with _pools_lock:
+        pool = _pools.get(key)
+
+        if pool is None:
+            timer = datatier._Timer("get_db_conn", None)
+
+            try:
+                pool = await aiomysql.create_pool(
+                    host=endpoint,
+                    port=portnum,
+                    user=username,
+                    password=pwd,
+                    db=dbname,
+                    autocommit=True,
+                    client_flag=CLIENT.MULTI_STATEMENTS if multi_statements else 0,
+                    minsize=0,
+                    maxsize=_pool_max_size,
+                    pool_recycle=POOL_MAX_IDLE_SECONDS,
+                )
+            except Exception as err:
+                timer.failed = True
+                print("datatier_async.get_pool() failed:")
+                print(str(err))
+                raise
+            finally:
+                timer.finish()
+
+            _pools[key] = pool
+
+        return pool
+
+
+@contextlib.asynccontextmanager
+async def acquire_db_conn(
+    endpoint: str,
+    portnum: int,
+    username: str,
+    pwd: str,
+    dbname: str,
+    multi_statements: bool = False,
+):
+    """Borrows a pooled connection for the duration of an `async with` block.
+
+    The connection goes back to the pool when the block exits. If the block
+    raised, the connection is closed instead, which also rolls back any open
+    transaction, so no session state it was left in reaches a later request.
+
+    Args:
+        endpoint (str): The machine name or IP address of server.
+        portnum (int): The server port number.
+        username (str): The user name for login.
+        pwd (str): The user password for login.
+        dbname (str): The database name.
+        multi_statements (bool): Whether to borrow from the pool whose
+            connections accept several statements per query, as
+            retrieve_many() needs. Defaults to False.
+
+    Yields:
+        aiomysql.Connection: A database connection object.
+    """
+    pool = await get_pool(endpoint, portnum, username, pwd, dbname, multi_statements)
+    db_conn = await pool.acquire()
+
+    try:
+        yield db_conn
+    except BaseException:
+        db_conn.close()
+        raise
+    finally:
+        # A closed connection is dropped by the pool instead of reused.
+        pool.release(db_conn)
+
+
+async def close_pools():
+    """Closes every pool and waits for its connections to close."""
+    async with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+        await pool.wait_closed()
+
+
+def resize_pools(max_size: int):
+    """Sets the size cap of pools created from now on.
+
+    Args:
+        max_size (int): The most connections each pool may hold open at once.
+
+    Raises:
+        ValueError: max_size is not positive.
+    """
+    global _pool_max_size
+
+    if max_size < 1:
+        raise ValueError("max_size must be at least 1.")
+
+    _pool_max_size = max_size
+
+
+async def retrieve_one_row(db_conn, sql, parameters: list[object] = []):
+    """Executes a SQL SELECT query that is expected to return at most one row.
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+        sql (str): The SQL select query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+
+    Returns:
+        tuple: The row retrieved, or () if the SELECT retrieves no data.
+
+    Raises:
+        Exception: Attempt to retrieve data failed.
+    """
+    timer = datatier._Timer("retrieve_one_row", sql)
+
+    try:
+        async with db_conn.cursor() as db_cursor:
+            await db_cursor.execute(sql, parameters)
+            timer.executed()
+            row = await db_cursor.fetchone()
+
+        if row is None:
+            return ()
+
+        timer.rows = 1
+        return row
+    except Exception as err:
+        timer.failed = True
+        print("datatier_async.retrieve_one_row() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+async def retrieve_all_rows(db_conn, sql, parameters: list[object] = []):
+    """Executes a SQL SELECT query that is expected to return multiple rows.
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+        sql (str): The SQL select query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+
+    Returns:
+        list[tuple]: The rows retrieved, or [] if the SELECT retrieves no data.
+
+    Raises:
+        Exception: Attempt to retrieve data failed.
+    """
+    timer = datatier._Timer("retrieve_all_rows", sql)
+
+    try:
+        async with db_conn.cursor() as db_cursor:
+            await db_cursor.execute(sql, parameters)
+            timer.executed()
+            rows = await db_cursor.fetchall()
+
+        timer.rows = len(rows)
+        return list(rows)
+    except Exception as err:
+        timer.failed = True
+        print("datatier_async.retrieve_all_rows() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+async def retrieve_many(db_conn, queries: list[tuple[str, list[object]]]):
+    """Executes several SQL SELECT queries in a single round trip.
+
+    The connection must come from acquire_db_conn(..., multi_statements=True).
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+        queries (list[tuple[str, list[object]]]): (sql, parameters) pairs, where
+            each sql is a single SELECT that can be parameterized with %s.
+
+    Returns:
+        list[tuple]: One result per query, in order. Each result is a tuple of
+            rows, empty if that SELECT retrieves no data.
+
+    Raises:
+        Exception: Attempt to retrieve data failed.
+    """
+    if not queries:
+        return []
+
+    timer = datatier._Timer("retrieve_many", ";\n".join(sql for sql, _ in queries))
+
+    try:
+        async with db_conn.cursor() as db_cursor:
+            statements = [
+                db_cursor.mogrify(sql, parameters).strip().rstrip(";")
+                for sql, parameters in queries
+            ]
+            await db_cursor.execute(";\n".join(statements))
+            timer.executed()
+
+            results = [tuple(await db_cursor.fetchall())]
+            while await db_cursor.nextset():
+                results.append(tuple(await db_cursor.fetchall()))
+
+        timer.rows = sum(len(result) for result in results)
+        return results
+    except Exception as err:
+        timer.failed = True
+        print("datatier_async.retrieve_many() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+async def perform_action(db_conn, sql, parameters: list[object] = []):
+    """Executes a SQL ACTION query against the database connection.
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+        sql (str): The SQL ACTION query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+
+    Returns:
+        int: The number of rows modified.
+
+    Raises:
+        Exception: Attempt to perform action failed.
+    """
+    timer = datatier._Timer("perform_action", sql)
+
+    try:
+        async with db_conn.cursor() as db_cursor:
+            await db_cursor.execute(sql, parameters)
+            await db_conn.commit()
+            timer.executed()
+            timer.rows = db_cursor.rowcount
+            return db_cursor.rowcount
+    except Exception as err:
+        timer.failed = True
+        await db_conn.rollback()
+        print("datatier_async.perform_action() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+async def execute_action(db_conn, sql, parameters: list[object] = []):
+    """Executes a SQL ACTION query without committing it.
+
+    Use inside a `transaction` block so that several actions are committed, or
+    rolled back, together.
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+        sql (str): The SQL ACTION query, which can be parameterized with %s.
+        parameters (list[object], optional): List of values if the query was
+            paramaterized. Defaults to [].
+
+    Returns:
+        int: The number of rows modified.
+
+    Raises:
+        Exception: Attempt to perform action failed.
+    """
+    timer = datatier._Timer("execute_action", sql)
+
+    try:
+        async with db_conn.cursor() as db_cursor:
+            await db_cursor.execute(sql, parameters)
+            timer.executed()
+            timer.rows = db_cursor.rowcount
+            return db_cursor.rowcount
+    except Exception as err:
+        timer.failed = True
+        print("datatier_async.execute_action() failed:")
+        print(str(err))
+        raise
+    finally:
+        timer.finish()
+
+
+@contextlib.asynccontextmanager
+async def transaction(db_conn):
+    """Groups the actions run in an `async with` block into one transaction.
+
+    The transaction is committed once when the block exits, or rolled back if
+    the block raised.
+
+    Args:
+        db_conn (aiomysql.Connection): The database connection object.
+
+    Yields:
+        aiomysql.Connection: The same connection, for use with execute_action.
+
+    Raises:
+        Exception: Attempt to commit the transaction failed.
+    """
+    await db_conn.begin()
+
+    try:
+        yield db_conn
+        await db_conn.commit()
+    except BaseException:
+        try:
+            await db_conn.rollback()
+        except Exception as err:
+            print("datatier_async.transaction() rollback failed:")
+            print(str(err))
+        raise
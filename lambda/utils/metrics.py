@@ -0,0 +1,187 @@
+"""Aggregates datatier query timings into per-query latency histograms.
+
+This file contains the following classes:
+
+    * QueryStats - latency histograms and row counts per SQL fingerprint
+
+This file contains the following functions:
+
+    * install - registers a QueryStats object as a datatier hook
+"""
+
+import json
+import threading
+
+from utils import datatier
+
+#
+# Upper bounds, in milliseconds, of the histogram buckets. Anything slower than
+# the last bound lands in one final overflow bucket.
+#
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+PHASES = ("connect", "execute", "fetch")
+
+
+class QueryStats:
+    """Latency histograms and row counts, grouped by SQL fingerprint.
+
+    Connections opened by datatier.get_db_conn() are grouped under the
+    fingerprint "<connect>". An instance is callable, so it can be passed to
+    datatier.add_hook() directly.
+    """
+
+    def __init__(self):
+        """Creates an empty set of statistics."""
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, event: dict):
+        """Records one datatier hook event; see datatier.add_hook()."""
+        self.record(event)
+
+    def record(self, event: dict):
+        """Records one datatier hook event.
+
+        Args:
+            event (dict): The event passed to datatier hooks.
+        """
+        key = event["fingerprint"] or "<connect>"
+        seconds = {phase: event[phase + "_seconds"] for phase in PHASES}
+        total_ms = sum(seconds.values()) * 1000
+
+        with self._lock:
+            stats = self._stats.get(key)
+
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "failures": 0,
+                    "rows": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "buckets": [0] * (len(BUCKET_BOUNDS_MS) + 1),
+                }
+                for phase in PHASES:
+                    stats[phase + "_ms"] = 0.0
+                self._stats[key] = stats
+
+            stats["count"] += 1
+            stats["failures"] += 1 if event["failed"] else 0
+            stats["rows"] += max(event["rows"], 0)
+            stats["total_ms"] += total_ms
+            stats["max_ms"] = max(stats["max_ms"], total_ms)
+            stats["buckets"][_bucket(total_ms)] += 1
+
+            for phase in PHASES:
+                stats[phase + "_ms"] += seconds[phase] * 1000
+
+    def snapshot(self):
+        """Returns a copy of the statistics gathered so far.
+
+        Returns:
+            dict: Maps each fingerprint to its count, failures, rows, total_ms,
+                max_ms, p50_ms, p99_ms, per-phase totals and histogram buckets.
+        """
+        with self._lock:
+            stats = {
+                key: dict(value, buckets=list(value["buckets"]))
+                for key, value in self._stats.items()
+            }
+
+        for value in stats.values():
+            value["p50_ms"] = _percentile(value["buckets"], 0.50)
+            value["p99_ms"] = _percentile(value["buckets"], 0.99)
+
+        return stats
+
+    def top(self, n: int = 10):
+        """Returns the fingerprints that have spent the most time in the database.
+
+        Args:
+            n (int): How many fingerprints to return. Defaults to 10.
+
+        Returns:
+            list[tuple[str, dict]]: (fingerprint, statistics) pairs, slowest first.
+        """
+        stats = self.snapshot()
+        ranked = sorted(stats.items(), key=lambda item: item[1]["total_ms"])
+
+        return ranked[::-1][:n]
+
+    def log_summary(self, n: int = 10):
+        """Prints the top fingerprints as one JSON line for CloudWatch.
+
+        Args:
+            n (int): How many fingerprints to include. Defaults to 10.
+        """
+        summary = [
+            {
+                "fingerprint": key,
+                "count": value["count"],
+                "failures": value["failures"],
+                "rows": value["rows"],
+                "total_ms": round(value["total_ms"], 3),
+                "p50_ms": value["p50_ms"],
+                "p99_ms": value["p99_ms"],
+                "max_ms": round(value["max_ms"], 3),
+            }
+            for key, value in self.top(n)
+        ]
+
+        print("**QUERY STATS**")
+        print(json.dumps(summary))
+
+    def reset(self):
+        """Discards all statistics gathered so far."""
+        with self._lock:
+            self._stats = {}
+
+
+def _bucket(milliseconds: float):
+    """Returns the index of the histogram bucket for a latency."""
+    for i, bound in enumerate(BUCKET_BOUNDS_MS):
+        if milliseconds <= bound:
+            return i
+
+    return len(BUCKET_BOUNDS_MS)
+
+
+def _percentile(buckets: list[int], fraction: float):
+    """Estimates a percentile as the upper bound of the bucket that holds it.
+
+    Returns None when there is nothing recorded, and the string ">" plus the
+    last bound when the percentile falls in the overflow bucket.
+    """
+    count = sum(buckets)
+    if count == 0:
+        return None
+
+    target = fraction * count
+    seen = 0
+
+    for i, bucket in enumerate(buckets):
+        seen += bucket
+        if seen >= target:
+            if i < len(BUCKET_BOUNDS_MS):
+                return BUCKET_BOUNDS_MS[i]
+            break
+
+    return ">" + str(BUCKET_BOUNDS_MS[-1])
+
+
+def install(stats: QueryStats | None = None):
+    """Registers a QueryStats object as a datatier hook.
+
+    Args:
+        stats (QueryStats | None): The object to record into. A new one is
+            created if None.
+
+    Returns:
+        QueryStats: The registered object.
+    """
+    if stats is None:
+        stats = QueryStats()
+
+    datatier.add_hook(stats)
+    return stats
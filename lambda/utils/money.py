@@ -0,0 +1,53 @@
+"""Handles amounts of money as exact fixed-point values.
+
+Money is stored as DECIMAL(12,2), which pymysql reads as decimal.Decimal, and
+request bodies are parsed with `parse_float=Decimal`. Amounts are therefore
+never binary floats on the server, so sums of deltas match their source rows
+to the cent.
+
+This file contains the following functions:
+
+    * parse - checks an amount from a request and returns it as a Decimal
+"""
+
+import decimal
+
+#
+# The smallest unit, and the largest amount a DECIMAL(12,2) column holds.
+#
+CENT = decimal.Decimal("0.01")
+MAX_AMOUNT = decimal.Decimal("9999999999.99")
+
+
+def parse(value):
+    """Checks an amount from a request and returns it as a Decimal.
+
+    Args:
+        value (Decimal | int | float | str): The amount, e.g. a cost or budget.
+
+    Returns:
+        Decimal: The amount, with two decimal places.
+
+    Raises:
+        ValueError: The amount is not a number, has fractions of a cent, or is
+            too large to store.
+    """
+    if isinstance(value, bool):
+        raise ValueError("not an amount of money: " + str(value))
+
+    try:
+        # repr() of a float is the shortest string that reads back as it.
+        amount = decimal.Decimal(repr(value) if isinstance(value, float) else value)
+    except (decimal.InvalidOperation, TypeError):
+        raise ValueError("not an amount of money: " + str(value)) from None
+
+    if not amount.is_finite():
+        raise ValueError("not an amount of money: " + str(value))
+
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError("amount too large: " + str(value))
+
+    if amount != amount.quantize(CENT, decimal.ROUND_DOWN):
+        raise ValueError("fractions of a cent: " + str(value))
+
+    return amount.quantize(CENT)
@@ -0,0 +1,214 @@
+"""Issues, rotates and revokes refresh tokens.
+
+A refresh token is a random string that a client exchanges for a new access
+token without sending its password again. Only an HMAC-SHA256 of each token,
+keyed with the signing secret, is stored, so a copy of the table cannot be
+used to log in.
+
+Every exchange rotates the token: the old one is marked used and a new one in
+the same family (i.e. descended from the same login) is returned. A used token
+that is presented again means the token was copied, so its whole family is
+revoked.
+
+This file contains the following functions:
+
+    * hash_token - returns the stored form of a refresh token
+    * new_token - creates a refresh token and the parameters to store it
+    * issue - stores a new refresh token and returns it
+    * rotate - exchanges a refresh token for a new one in the same family
+    * revoke_family - revokes every token descended from the same login
+    * revoke - revokes the family of a given refresh token
+"""
+
+import hashlib
+import hmac
+import secrets
+
+from utils import datatier
+
+#
+# How long a refresh token stays valid if it is not used, in days.
+#
+REFRESH_TOKEN_DAYS = 30
+
+#
+# Stores a token, given the parameters from new_token().
+#
+ISSUE_SQL = """
+INSERT INTO refreshtokens (userid, tokenhash, familyid, expires)
+VALUES (%s, %s, %s, UTC_TIMESTAMP() + INTERVAL %s DAY);
+"""
+
+LOOKUP_SQL = """
+SELECT tokenid, userid, familyid, usedat IS NOT NULL, revoked,
+    expires > UTC_TIMESTAMP()
+FROM refreshtokens
+WHERE tokenhash = %s;
+"""
+
+#
+# Marks a token used. Matches no row if another request used it first.
+#
+CLAIM_SQL = """
+UPDATE refreshtokens
+SET usedat = UTC_TIMESTAMP()
+WHERE tokenid = %s
+AND usedat IS NULL;
+"""
+
+REVOKE_FAMILY_SQL = """
+UPDATE refreshtokens
+SET revoked = 1
+WHERE familyid = %s;
+"""
+
+#
+# Revokes the family of a token, given its hash and owner, in one statement.
+#
+REVOKE_SQL = """
+UPDATE refreshtokens AS family
+JOIN refreshtokens AS token ON token.familyid = family.familyid
+SET family.revoked = 1
+WHERE token.tokenhash = %s
+AND token.userid = %s;
+"""
+
+
+def hash_token(token: str, secret: str):
+    """Returns the stored form of a refresh token.
+
+    Args:
+        token (str): The refresh token.
+        secret (str): The secret key to hash the token with.
+
+    Returns:
+        str: The hex HMAC-SHA256 of the token.
+    """
+    return hmac.new(
+        secret.encode("utf-8"), token.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+def new_token(
+    userid, secret: str, days: int = REFRESH_TOKEN_DAYS, familyid: str | None = None
+):
+    """Creates a refresh token and the parameters that store it with ISSUE_SQL.
+
+    Args:
+        userid (int | str): The user's unique ID.
+        secret (str): The secret key to hash the token with.
+        days (int): How many days the token stays valid. Defaults to
+            REFRESH_TOKEN_DAYS.
+        familyid (str | None): The family to add the token to, or None to
+            start a new family. Defaults to None.
+
+    Returns:
+        tuple[str, list[object]]: The refresh token and the ISSUE_SQL parameters.
+    """
+    token = secrets.token_urlsafe(32)
+
+    if familyid is None:
+        familyid = secrets.token_hex(16)
+
+    return token, [userid, hash_token(token, secret), familyid, days]
+
+
+def issue(
+    db_conn,
+    userid,
+    secret: str,
+    days: int = REFRESH_TOKEN_DAYS,
+    familyid: str | None = None,
+):
+    """Stores a new refresh token and returns it.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        secret (str): The secret key to hash the token with.
+        days (int): How many days the token stays valid. Defaults to
+            REFRESH_TOKEN_DAYS.
+        familyid (str | None): The family to add the token to, or None to
+            start a new family. Defaults to None.
+
+    Returns:
+        str: The refresh token.
+    """
+    token, parameters = new_token(userid, secret, days, familyid)
+    datatier.execute_action(db_conn, ISSUE_SQL, parameters)
+
+    return token
+
+
+def rotate(db_conn, token: str, secret: str, days: int = REFRESH_TOKEN_DAYS):
+    """Exchanges a refresh token for a new one in the same family.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        token (str): The refresh token sent by the client.
+        secret (str): The secret key the token was hashed with.
+        days (int): How many days the new token stays valid. Defaults to
+            REFRESH_TOKEN_DAYS.
+
+    Returns:
+        tuple[int, str] | tuple[None, None]: The user's ID and the new refresh
+            token, or (None, None) if the token is unknown, expired, revoked or
+            already used.
+    """
+    row = datatier.retrieve_one_row(db_conn, LOOKUP_SQL, [hash_token(token, secret)])
+
+    if row == ():
+        return None, None
+
+    tokenid, userid, familyid, used, revoked, live = row
+
+    if revoked or not live:
+        return None, None
+
+    if not used:
+        with datatier.transaction(db_conn):
+            claimed = datatier.execute_action(db_conn, CLAIM_SQL, [tokenid]) == 1
+
+            if claimed:
+                new = issue(db_conn, userid, secret, days, familyid)
+
+        if claimed:
+            return userid, new
+
+    #
+    # The token was used before, so someone else holds a copy of it.
+    #
+    print("**Refresh token reused, revoking its family**")
+    revoke_family(db_conn, familyid)
+
+    return None, None
+
+
+def revoke_family(db_conn, familyid: str):
+    """Revokes every refresh token descended from the same login.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        familyid (str): The family to revoke.
+
+    Returns:
+        int: The number of tokens revoked.
+    """
+    return datatier.perform_action(db_conn, REVOKE_FAMILY_SQL, [familyid])
+
+
+def revoke(db_conn, token: str, userid, secret: str):
+    """Revokes the family of a refresh token, e.g. when its user logs out.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        token (str): The refresh token sent by the client.
+        userid (int | str): The user the token must belong to.
+        secret (str): The secret key the token was hashed with.
+
+    Returns:
+        int: The number of tokens revoked; 0 if the token is unknown.
+    """
+    return datatier.execute_action(
+        db_conn, REVOKE_SQL, [hash_token(token, secret), userid]
+    )
@@ -0,0 +1,199 @@
+"""Tracks revoked access tokens without a database lookup per request.
+
+Revoked tokens are stored by their `jti` claim in the revokedtokens table until
+they would have expired anyway. Each process keeps a Bloom filter of those
+IDs, reloaded every REFRESH_SECONDS. A token whose ID is not in the filter is
+certainly not revoked, as of the last reload; only a "maybe" is checked against
+the table. Tokens revoked by this process are added to its filter at once,
+while other processes pick them up at their next reload.
+
+This file contains the following classes:
+
+    * BloomFilter - a set of strings that may report false positives
+
+This file contains the following functions:
+
+    * configure - sets the database the revocation store lives in
+    * is_revoked - checks whether a token ID has been revoked
+    * revoke - revokes a token ID until the token's expiry
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from utils import datatier
+
+#
+# How often, in seconds, each process reloads its filter, and the false
+# positive rate the filter is sized for.
+#
+REFRESH_SECONDS = 30
+FALSE_POSITIVE_RATE = 0.01
+
+LOAD_SQL = "SELECT jti FROM revokedtokens WHERE expires > UTC_TIMESTAMP();"
+
+CHECK_SQL = "SELECT 1 FROM revokedtokens WHERE jti = %s;"
+
+REVOKE_SQL = """
+INSERT IGNORE INTO revokedtokens (jti, userid, expires)
+VALUES (%s, %s, UTC_TIMESTAMP() + INTERVAL (%s - UNIX_TIMESTAMP()) SECOND);
+"""
+
+#
+# Rows past their expiry are deleted a batch at a time as tokens are revoked.
+#
+PURGE_SQL = """
+DELETE FROM revokedtokens
+WHERE expires < UTC_TIMESTAMP()
+LIMIT 1000;
+"""
+
+_settings = None
+_filter = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+class BloomFilter:
+    """A set of strings that may report false positives, but never negatives."""
+
+    def __init__(self, capacity: int, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        """Creates an empty filter.
+
+        Args:
+            capacity (int): How many items the filter is sized for.
+            false_positive_rate (float): The chance that an item not in the
+                filter is reported as present once it holds `capacity` items.
+                Defaults to FALSE_POSITIVE_RATE.
+        """
+        capacity = max(capacity, 64)
+
+        self.size = math.ceil(
+            -capacity * math.log(false_positive_rate) / (math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        """Yields the bit positions of an item, by double hashing one digest."""
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str):
+        """Adds an item to the filter.
+
+        Args:
+            item (str): The item to add.
+        """
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str):
+        """Checks whether an item may be in the filter.
+
+        Args:
+            item (str): The item to check.
+
+        Returns:
+            bool: False if the item was never added, True if it may have been.
+        """
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+def configure(settings: tuple):
+    """Sets the database the revocation store lives in.
+
+    Args:
+        settings (tuple): Connection settings in acquire_db_conn() argument
+            order. Use the primary, so fresh revocations are always seen.
+    """
+    global _settings, _filter
+
+    with _lock:
+        _settings = settings
+        _filter = None
+
+
+def _current_filter():
+    """Returns the filter, reloading it from the table when it is stale.
+
+    Only one thread reloads at a time; the others keep using the old filter
+    meanwhile. If a reload fails, the old filter stays in use until the next
+    attempt.
+    """
+    global _filter, _loaded_at
+
+    if _filter is not None and time.monotonic() - _loaded_at < REFRESH_SECONDS:
+        return _filter
+
+    if not _lock.acquire(blocking=_filter is None):
+        return _filter
+
+    try:
+        if _filter is None or time.monotonic() - _loaded_at >= REFRESH_SECONDS:
+            try:
+                with datatier.acquire_db_conn(*_settings) as db_conn:
+                    rows = datatier.retrieve_all_rows(db_conn, LOAD_SQL)
+            except Exception as err:
+                if _filter is None:
+                    raise
+
+                print("revocation filter reload failed:")
+                print(str(err))
+                return _filter
+
+            bloom = BloomFilter(2 * len(rows))
+            for (jti,) in rows:
+                bloom.add(jti)
+
+            _filter = bloom
+            _loaded_at = time.monotonic()
+
+        return _filter
+    finally:
+        _lock.release()
+
+
+def is_revoked(jti: str):
+    """Checks whether a token ID has been revoked.
+
+    Args:
+        jti (str): The token's `jti` claim.
+
+    Returns:
+        bool: True if the token has been revoked, otherwise False.
+    """
+    if _settings is None or jti not in _current_filter():
+        return False
+
+    print("**Checking revocation of a possibly revoked token**")
+    with datatier.acquire_db_conn(*_settings) as db_conn:
+        return datatier.retrieve_one_row(db_conn, CHECK_SQL, [jti]) != ()
+
+
+def revoke(db_conn, jti: str, userid, exp: int):
+    """Revokes a token ID until the token would have expired.
+
+    Nothing is committed here, so this may run inside a datatier.transaction.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        jti (str): The token's `jti` claim.
+        userid (int | str): The token's user.
+        exp (int): The token's `exp` claim, in seconds since the epoch.
+    """
+    datatier.execute_action(db_conn, REVOKE_SQL, [jti, userid, exp])
+    datatier.execute_action(db_conn, PURGE_SQL)
+
+    with _lock:
+        if _filter is not None:
+            _filter.add(jti)
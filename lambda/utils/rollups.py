@@ -0,0 +1,218 @@
+"""Keeps monthly totals of each user's transactions, per category.
+
+Each row of monthly_rollups holds the sum, count, smallest and largest cost
+of one user's transactions in one category and month, so a month's total is a
+primary key lookup however long the history grows. The rows are changed in the
+same database transaction as the transactions they summarize.
+
+Adding a cost updates its row in one statement. Removing a cost is just as
+cheap unless it was the month's smallest or largest, in which case only those
+two are read again from that month's transactions.
+
+This file contains the following functions:
+
+    * month_of - returns the month a date falls in and its bounds
+    * add - counts a transaction in its month's rollup
+    * remove - takes a transaction out of its month's rollup
+    * merge - moves one category's rollups into another's
+    * rebuild - regenerates rollups from transactions, one user at a time
+"""
+
+import datetime
+
+from utils import datatier
+
+ADD_SQL = """
+INSERT INTO monthly_rollups
+  (userid, yearmonth, categoryid, total, count, smallest, largest)
+VALUES (%s, %s, %s, %s, 1, %s, %s)
+ON DUPLICATE KEY UPDATE
+  total = total + VALUES(total),
+  count = count + 1,
+  smallest = LEAST(smallest, VALUES(smallest)),
+  largest = GREATEST(largest, VALUES(largest));
+"""
+
+SUBTRACT_SQL = """
+UPDATE monthly_rollups
+SET total = total - %s,
+  count = count - 1
+WHERE userid = %s
+AND yearmonth = %s
+AND categoryid = %s;
+"""
+
+#
+# Reads the month's smallest and largest cost again, only if the removed cost
+# was one of them. A month left empty keeps its old values until it is dropped.
+#
+RESCAN_SQL = """
+UPDATE monthly_rollups AS r
+JOIN (
+  SELECT MIN(cost) AS smallest, MAX(cost) AS largest
+  FROM transactions
+  WHERE userid = %s
+  AND categoryid = %s
+  AND transactiondate >= %s
+  AND transactiondate < %s
+) AS t
+SET r.smallest = COALESCE(t.smallest, r.smallest),
+  r.largest = COALESCE(t.largest, r.largest)
+WHERE r.userid = %s
+AND r.yearmonth = %s
+AND r.categoryid = %s
+AND (r.smallest = %s OR r.largest = %s);
+"""
+
+DROP_EMPTY_SQL = """
+DELETE FROM monthly_rollups
+WHERE userid = %s
+AND yearmonth = %s
+AND categoryid = %s
+AND count = 0;
+"""
+
+#
+# Both the target and the SELECT read monthly_rollups, so every column is
+# qualified; a bare one is ambiguous to MySQL (error 1052).
+#
+MERGE_SQL = """
+INSERT INTO monthly_rollups
+  (userid, yearmonth, categoryid, total, count, smallest, largest)
+SELECT source.userid, source.yearmonth, %s, source.total, source.count,
+  source.smallest, source.largest
+FROM monthly_rollups AS source
+WHERE source.userid = %s
+AND source.categoryid = %s
+ON DUPLICATE KEY UPDATE
+  monthly_rollups.total = monthly_rollups.total + VALUES(total),
+  monthly_rollups.count = monthly_rollups.count + VALUES(count),
+  monthly_rollups.smallest = LEAST(monthly_rollups.smallest, VALUES(smallest)),
+  monthly_rollups.largest = GREATEST(monthly_rollups.largest, VALUES(largest));
+"""
+
+DELETE_CATEGORY_SQL = """
+DELETE FROM monthly_rollups
+WHERE userid = %s
+AND categoryid = %s;
+"""
+
+DELETE_USER_SQL = """
+DELETE FROM monthly_rollups
+WHERE userid = %s;
+"""
+
+REBUILD_SQL = """
+INSERT INTO monthly_rollups
+  (userid, yearmonth, categoryid, total, count, smallest, largest)
+SELECT userid, EXTRACT(YEAR_MONTH FROM transactiondate), categoryid,
+  SUM(cost), COUNT(*), MIN(cost), MAX(cost)
+FROM transactions
+WHERE userid = %s
+GROUP BY userid, EXTRACT(YEAR_MONTH FROM transactiondate), categoryid;
+"""
+
+
+def month_of(date):
+    """Returns the month a date falls in and its bounds.
+
+    Args:
+        date (datetime.date | str): The date, or a string in the YYYY-MM-DD or
+            YYYYMMDD form that MySQL accepts.
+
+    Returns:
+        tuple[int, datetime.date, datetime.date]: The month as YYYYMM, its first
+            day, and the first day of the next month.
+
+    Raises:
+        ValueError: The date is not valid.
+    """
+    if not isinstance(date, datetime.date):
+        date = datetime.date.fromisoformat(str(date))
+
+    first = date.replace(day=1)
+    following = (first + datetime.timedelta(days=31)).replace(day=1)
+
+    return first.year * 100 + first.month, first, following
+
+
+def add(db_conn, userid, categoryid, date, cost):
+    """Counts a transaction in its month's rollup.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        categoryid (int): The transaction's category.
+        date (datetime.date | str): The transaction's date.
+        cost (Decimal): The transaction's cost.
+    """
+    yearmonth, _, _ = month_of(date)
+    datatier.execute_action(
+        db_conn, ADD_SQL, [userid, yearmonth, categoryid, cost, cost, cost]
+    )
+
+
+def remove(db_conn, userid, categoryid, date, cost):
+    """Takes a transaction out of its month's rollup.
+
+    Call this after the transaction itself is deleted or changed, so that the
+    month's smallest and largest costs are read without it.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        categoryid (int): The transaction's category.
+        date (datetime.date | str): The transaction's date.
+        cost (Decimal): The transaction's cost.
+    """
+    yearmonth, first, following = month_of(date)
+    key = [userid, yearmonth, categoryid]
+
+    datatier.execute_action(db_conn, SUBTRACT_SQL, [cost, *key])
+    datatier.execute_action(
+        db_conn,
+        RESCAN_SQL,
+        [userid, categoryid, first, following, *key, cost, cost],
+    )
+    datatier.execute_action(db_conn, DROP_EMPTY_SQL, key)
+
+
+def merge(db_conn, userid, source, target):
+    """Moves one category's rollups into another's.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        source (int): The categoryid whose rollups are moved.
+        target (int): The categoryid to move them to.
+    """
+    datatier.execute_action(db_conn, MERGE_SQL, [target, userid, source])
+    datatier.execute_action(db_conn, DELETE_CATEGORY_SQL, [userid, source])
+
+
+def rebuild(db_conn, userid=None):
+    """Regenerates rollups from transactions, one user at a time.
+
+    Each user's rollups are replaced in a transaction of their own, so the
+    table is never locked as a whole and every user's totals stay consistent.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str | None): The user to rebuild, or None for every
+            user. Defaults to None.
+
+    Returns:
+        int: The number of users rebuilt.
+    """
+    if userid is None:
+        rows = datatier.retrieve_all_rows(db_conn, "SELECT userid FROM users;")
+        userids = [row[0] for row in rows]
+    else:
+        userids = [userid]
+
+    for userid in userids:
+        with datatier.transaction(db_conn):
+            datatier.execute_action(db_conn, DELETE_USER_SQL, [userid])
+            datatier.execute_action(db_conn, REBUILD_SQL, [userid])
+
+    return len(userids)
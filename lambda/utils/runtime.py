@@ -0,0 +1,343 @@
+"""Loads configuration once per container and wraps Lambda handlers.
+
+Everything at module level runs once, when a container first imports this file.
+Warm invocations reuse the parsed config, the secret and the connection pools.
+
+This file contains the following classes:
+
+    * Request - the parsed parts of an API Gateway event
+
+This file contains the following functions:
+
+    * handler - decorator that turns core logic into a Lambda handler
+    * async_handler - decorator that turns async core logic into a coroutine
+      handler for the asyncio server
+"""
+
+import asyncio
+import decimal
+import functools
+import json
+import os
+
+import jwt
+
+from configparser import ConfigParser
+from utils import datatier, auth, api_utils, metrics, usercache, refresh_tokens
+from utils import revocation
+
+#
+# Setup AWS based on config file.
+#
+CONFIG_FILE = "lambda-config.ini"
+os.environ["AWS_SHARED_CREDENTIALS_FILE"] = CONFIG_FILE
+
+CONFIG = ConfigParser()
+CONFIG.read(CONFIG_FILE)
+
+#
+# The signing secret can be supplied through the environment (e.g. from the
+# Lambda's encrypted environment variables) instead of the config file.
+#
+SECRET = os.environ.get("BUDGETAPP_SECRET_KEY") or CONFIG.get("secret", "key")
+
+#
+# How long refresh tokens stay valid, in days.
+#
+REFRESH_TOKEN_DAYS = CONFIG.getint(
+    "auth", "refresh_token_days", fallback=refresh_tokens.REFRESH_TOKEN_DAYS
+)
+
+#
+# Verified access tokens are cached until they expire.
+#
+auth.resize_token_cache(
+    CONFIG.getint("auth", "token_cache_size", fallback=auth.TOKEN_CACHE_MAX_SIZE)
+)
+
+#
+# The bcrypt cost, either fixed or calibrated to a target time on this host.
+#
+if CONFIG.has_option("auth", "bcrypt_target_ms"):
+    auth.set_default_rounds(
+        auth.calibrate_rounds(CONFIG.getfloat("auth", "bcrypt_target_ms") / 1000),
+        calibrated=True,
+    )
+else:
+    auth.set_default_rounds(
+        CONFIG.getint("auth", "bcrypt_rounds", fallback=auth.BCRYPT_DEFAULT_ROUNDS)
+    )
+
+#
+# Known user IDs are cached too, so handlers can skip the users lookup.
+#
+usercache.configure(
+    CONFIG.getfloat("auth", "user_cache_ttl", fallback=usercache.TTL_SECONDS),
+    CONFIG.getfloat(
+        "auth", "user_cache_negative_ttl", fallback=usercache.NEGATIVE_TTL_SECONDS
+    ),
+)
+
+#
+# Configure for RDS access, and create the pools for the primary and read
+# endpoints up front. Connections themselves are opened on first use.
+#
+RDS_SETTINGS = datatier.get_rds_settings(CONFIG)
+RDS_READ_SETTINGS = datatier.get_rds_settings(CONFIG, read_only=True)
+
+datatier.get_pool(*RDS_SETTINGS)
+datatier.get_pool(*RDS_READ_SETTINGS)
+
+#
+# Revoked tokens are read from the primary, so a logout is seen at once by
+# whichever container serves the next request with that token.
+#
+revocation.configure(RDS_SETTINGS)
+
+#
+# Optional query statistics, printed every `log_every` invocations.
+#
+QUERY_STATS = None
+QUERY_STATS_LOG_EVERY = CONFIG.getint("metrics", "log_every", fallback=100)
+
+if CONFIG.getboolean("metrics", "enabled", fallback=False):
+    QUERY_STATS = metrics.install()
+
+_invocations = 0
+
+
+class Request:
+    """The parsed parts of an API Gateway event."""
+
+    def __init__(self, event: dict, context):
+        """Parses an API Gateway event.
+
+        Args:
+            event (dict): A JSON representation of the HTTP request.
+            context (lambda context object): Provides information about the
+                invocation, function, and runtime environment.
+        """
+        self.event = event
+        self.context = context
+        self.method = event.get("httpMethod")
+        self.headers = event.get("headers") or {}
+        self.path_parameters = event.get("pathParameters") or {}
+        self.query_parameters = event.get("queryStringParameters") or {}
+        self.read_your_writes = api_utils.wants_read_your_writes(event)
+
+        # Filled in by the handler decorator when the route requires them.
+        self.body = None
+        self.token = None
+        self.userid = None
+
+    def rds_settings(self, read_only: bool = False):
+        """Returns the connection settings this request should use.
+
+        Args:
+            read_only (bool): Whether the caller only runs SELECT queries. Such
+                work goes to the read endpoint unless the client asked to read
+                its own writes. Defaults to False.
+
+        Returns:
+            tuple[str, int, str, str, str]: See datatier.get_rds_settings().
+        """
+        if read_only and not self.read_your_writes:
+            return RDS_READ_SETTINGS
+
+        return RDS_SETTINGS
+
+    def db_conn(self, read_only: bool = False):
+        """Borrows a pooled connection for the duration of a `with` block.
+
+        Args:
+            read_only (bool): Whether the caller only runs SELECT queries.
+                Defaults to False.
+
+        Returns:
+            ContextManager[Connection[Cursor]]: See datatier.acquire_db_conn().
+        """
+        return datatier.acquire_db_conn(*self.rds_settings(read_only))
+
+
+def _authenticate(request: Request):
+    """Checks a request's bearer token and stores its user ID in the request.
+
+    The revocation check may query the database, so this can block.
+
+    Args:
+        request (Request): The request to authenticate.
+
+    Returns:
+        dict | None: An error response, or None if the token is valid.
+
+    Raises:
+        Exception: The revocation store could not be reached. This is not the
+            client's fault, so it is not answered with a 401.
+    """
+    print("**Accessing request headers**")
+
+    if "headers" not in request.event:
+        return api_utils.error(400, "no headers in request")
+
+    token = auth.get_token_from_header(request.headers)
+    if token is None:
+        return api_utils.error(401, "no bearer token in headers")
+
+    try:
+        request.userid = auth.get_user_from_token(
+            token, SECRET, is_revoked=revocation.is_revoked
+        )
+    except (jwt.InvalidTokenError, KeyError):  # KeyError: no user_id claim
+        return api_utils.error(401, "invalid access token: " + token)
+
+    request.token = token
+    return None
+
+
+def _prepare(request: Request, requires_body: bool, requires_token: bool):
+    """Checks and fills in the parts of a request that its route requires.
+
+    Args:
+        request (Request): The request to prepare.
+        requires_body (bool): Whether the route needs a JSON body.
+        requires_token (bool): Whether the route needs a valid bearer token.
+
+    Returns:
+        dict | None: An error response, or None if the request may proceed.
+    """
+    event = request.event
+
+    if requires_token:
+        response = _authenticate(request)
+        if response is not None:
+            return response
+
+    if event.get("body"):
+        # Amounts of money stay exact: see utils.money.
+        request.body = json.loads(event["body"], parse_float=decimal.Decimal)
+
+    if requires_body:
+        print("**Accessing request body**")
+
+        if request.body is None:
+            return api_utils.error(400, "no body in request")
+
+    return None
+
+
+def _count_invocation():
+    """Counts a finished invocation and prints query statistics when due."""
+    global _invocations
+
+    _invocations += 1
+    if QUERY_STATS and _invocations % QUERY_STATS_LOG_EVERY == 0:
+        QUERY_STATS.log_summary()
+        print("**TOKEN CACHE STATS**")
+        print(json.dumps(auth.token_cache_stats()))
+        print("**USER CACHE STATS**")
+        print(json.dumps(usercache.stats()))
+
+
+def handler(name: str, requires_body: bool = False, requires_token: bool = False):
+    """Turns a function that handles a Request into a Lambda handler.
+
+    The returned handler parses the event, checks for the body and bearer token
+    when the route requires them, and turns uncaught exceptions into 500
+    responses. The wrapped function is available as `__wrapped__`.
+
+    Args:
+        name (str): The name printed when the handler starts.
+        requires_body (bool): Respond 400 unless the event has a JSON body.
+            Defaults to False.
+        requires_token (bool): Respond 400 or 401 unless the event has a valid
+            bearer token, whose user ID is then stored in `request.userid`.
+            Defaults to False.
+
+    Returns:
+        Callable: A decorator for the core logic.
+    """
+
+    def decorate(core):
+        @functools.wraps(core)
+        def lambda_handler(event, context):
+            try:
+                print("**STARTING**")
+                print("**Lambda: " + name + "**")
+
+                request = Request(event, context)
+
+                response = _prepare(request, requires_body, requires_token)
+                if response is not None:
+                    return response
+
+                return core(request)
+
+            except Exception as err:
+                print("**ERROR**")
+                print(str(err))
+
+                return api_utils.error(500, str(err))
+
+            finally:
+                _count_invocation()
+
+        return lambda_handler
+
+    return decorate
+
+
+def async_handler(name: str, requires_body: bool = False, requires_token: bool = False):
+    """Turns a coroutine that handles a Request into a coroutine handler.
+
+    Works like handler(), but for core logic written against datatier_async.
+    The result takes the same (event, context) arguments and must be awaited.
+
+    Args:
+        name (str): The name printed when the handler starts.
+        requires_body (bool): Respond 400 unless the event has a JSON body.
+            Defaults to False.
+        requires_token (bool): Respond 400 or 401 unless the event has a valid
+            bearer token. Defaults to False.
+
+    Returns:
+        Callable: A decorator for the core logic.
+    """
+
+    def decorate(core):
+        @functools.wraps(core)
+        async def coroutine_handler(event, context):
+            try:
+                print("**STARTING**")
+                print("**Async: " + name + "**")
+
+                request = Request(event, context)
+
+                #
+                # The revocation check may block on the database, so it runs
+                # on the loop's executor rather than on the loop itself.
+                #
+                if requires_token:
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        None, _authenticate, request
+                    )
+                    if response is not None:
+                        return response
+
+                response = _prepare(request, requires_body, False)
+                if response is not None:
+                    return response
+
+                return await core(request)
+
+            except Exception as err:
+                print("**ERROR**")
+                print(str(err))
+
+                return api_utils.error(500, str(err))
+
+            finally:
+                _count_invocation()
+
+        return coroutine_handler
+
+    return decorate
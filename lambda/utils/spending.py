@@ -0,0 +1,190 @@
+"""Keeps each category's `spent`, and the monthly rollups, in step with its
+transactions.
+
+Every change is a relative update, `spent = spent + delta`, scoped to the
+user's own category, so two requests that land at once both count, and no
+value is read into Python first just to be written back. Costs already stored
+are read from the transactions table under a row lock rather than taken from
+the client.
+
+Run the changing functions inside the request's datatier.transaction, after
+the statements that insert, update or delete the transactions themselves.
+
+This file contains the following functions:
+
+    * find_category - returns a user's category by name
+    * find_categories - returns several of a user's categories by name
+    * lock_transaction - locks a transaction and returns what it counts toward
+    * apply - accounts for removed and added transactions, returning new totals
+    * merge - adds one category's spent and rollups to another's
+"""
+
+from utils import datatier, rollups
+
+LOOKUP_SQL = """
+SELECT categoryid, totalbudget, spent
+FROM categories
+WHERE userid = %s
+AND category = %s;
+"""
+
+#
+# One branch of find_categories(), tagged with the name's position. Each branch
+# is the same unique-index lookup as LOOKUP_SQL, so names match as they do
+# there, collation included.
+#
+LOOKUP_ONE_OF_SQL = """
+(SELECT %s, categoryid, totalbudget, spent
+FROM categories
+WHERE userid = %s
+AND category = %s)
+"""
+
+TRANSACTION_SQL = """
+SELECT categoryid, transactiondate, cost
+FROM transactions
+WHERE transactionid = %s
+AND userid = %s
+FOR UPDATE;
+"""
+
+ADD_SQL = """
+UPDATE categories
+SET spent = spent + %s
+WHERE categoryid = %s
+AND userid = %s;
+"""
+
+MERGE_SQL = """
+UPDATE categories AS target
+JOIN categories AS source ON source.categoryid = %s
+  AND source.userid = target.userid
+SET target.spent = target.spent + source.spent
+WHERE target.categoryid = %s
+AND target.userid = %s;
+"""
+
+
+def find_category(db_conn, userid, name: str):
+    """Returns a user's category by name.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        name (str): The category's name.
+
+    Returns:
+        tuple: The (categoryid, totalbudget, spent) row, or () if the user has
+            no such category.
+    """
+    return datatier.retrieve_one_row(db_conn, LOOKUP_SQL, [userid, name])
+
+
+def find_categories(db_conn, userid, names: list[str]):
+    """Returns several of a user's categories by name, in one statement.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        names (list[str]): The categories' names.
+
+    Returns:
+        list[tuple]: A (categoryid, totalbudget, spent) row, or (), per name.
+    """
+    sql = "UNION ALL".join([LOOKUP_ONE_OF_SQL] * len(names)) + ";"
+    parameters = []
+    for position, name in enumerate(names):
+        parameters += [position, userid, name]
+
+    rows = datatier.retrieve_all_rows(db_conn, sql, parameters)
+    found = {row[0]: tuple(row[1:]) for row in rows}
+
+    return [found.get(position, ()) for position in range(len(names))]
+
+
+def lock_transaction(db_conn, userid, transactionid):
+    """Locks a transaction until the end of the transaction and reads it.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        transactionid (int | str): The transaction's unique ID.
+
+    Returns:
+        tuple: The (categoryid, transactiondate, cost) row, or () if the user
+            has no such transaction.
+    """
+    return datatier.retrieve_one_row(db_conn, TRANSACTION_SQL, [transactionid, userid])
+
+
+def apply(db_conn, userid, removed: list[tuple] = [], added: list[tuple] = []):
+    """Accounts for removed and added transactions, and returns the new totals.
+
+    A changed transaction is removed as it was and added as it is now. Call
+    this after the transactions table itself has been changed.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        removed (list[tuple]): The (categoryid, transactiondate, cost) of each
+            transaction that no longer counts. Defaults to [].
+        added (list[tuple]): The (categoryid, transactiondate, cost) of each
+            transaction that now counts. Defaults to [].
+
+    Returns:
+        dict: The (totalbudget, spent) of each category involved, keyed by
+            categoryid.
+
+    Raises:
+        LookupError: A category does not belong to the user.
+    """
+    deltas = {}
+
+    for categoryid, date, cost in removed:
+        deltas[categoryid] = deltas.get(categoryid, 0) - cost
+        rollups.remove(db_conn, userid, categoryid, date, cost)
+
+    for categoryid, date, cost in added:
+        deltas[categoryid] = deltas.get(categoryid, 0) + cost
+        rollups.add(db_conn, userid, categoryid, date, cost)
+
+    if not deltas:
+        return {}
+
+    for categoryid, delta in deltas.items():
+        if delta == 0:
+            continue
+
+        # MySQL counts changed rows, and a non-zero delta always changes one.
+        if datatier.execute_action(db_conn, ADD_SQL, [delta, categoryid, userid]) == 0:
+            raise LookupError("no such category: " + str(categoryid))
+
+    #
+    # The updated rows stay locked until the transaction ends, so these are the
+    # totals this request leaves behind.
+    #
+    ids = list(deltas)
+    sql = """
+    SELECT categoryid, totalbudget, spent
+    FROM categories
+    WHERE userid = %s
+    AND categoryid IN (""" + ", ".join(["%s"] * len(ids)) + """);
+    """
+    rows = datatier.retrieve_all_rows(db_conn, sql, [userid, *ids])
+
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def merge(db_conn, userid, source, target):
+    """Adds one category's spent and rollups to another's, e.g. before deletion.
+
+    Both categories must belong to the user; otherwise nothing changes.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+        source (int): The categoryid whose spent is added.
+        target (int): The categoryid to add it to.
+    """
+    datatier.execute_action(db_conn, MERGE_SQL, [source, target, userid])
+    rollups.merge(db_conn, userid, source, target)
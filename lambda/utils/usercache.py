@@ -0,0 +1,152 @@
+"""Remembers which user IDs exist, so handlers need not look them up each time.
+
+Both answers are cached: a user that exists is remembered for TTL_SECONDS, and
+one that does not for the shorter NEGATIVE_TTL_SECONDS. The cache belongs to
+one process, so after a user is deleted other containers may still see it as
+existing until their entry expires. Anything that deletes users must call
+invalidate() in its own process.
+
+This file contains the following functions:
+
+    * lookup - returns the cached answer for a user ID, if any
+    * remember - caches whether a user ID exists
+    * user_exists - checks whether a user exists, using the cache when possible
+    * invalidate - forgets one user ID, or all of them
+    * configure - changes how long answers are cached
+    * stats - returns the cache's hit and miss counters
+"""
+
+import collections
+import threading
+import time
+
+from utils import datatier
+
+#
+# How long, in seconds, to remember that a user does or does not exist, and the
+# most user IDs to remember at once.
+#
+TTL_SECONDS = 60
+NEGATIVE_TTL_SECONDS = 5
+MAX_SIZE = 10000
+
+#
+# Checks that a user exists without reading any of its columns.
+#
+EXISTS_SQL = "SELECT 1 FROM users WHERE userid = %s;"
+
+_cache = collections.OrderedDict()
+_lock = threading.Lock()
+_ttl_seconds = TTL_SECONDS
+_negative_ttl_seconds = NEGATIVE_TTL_SECONDS
+_hits = 0
+_misses = 0
+
+
+def lookup(userid):
+    """Returns the cached answer for a user ID.
+
+    Args:
+        userid (int | str): The user's unique ID.
+
+    Returns:
+        bool | None: Whether the user exists, or None if that is not cached.
+    """
+    global _hits, _misses
+
+    key = str(userid)
+
+    with _lock:
+        entry = _cache.get(key)
+
+        if entry is not None:
+            exists, expires = entry
+
+            if expires > time.monotonic():
+                _cache.move_to_end(key)
+                _hits += 1
+                return exists
+
+            del _cache[key]
+
+        _misses += 1
+        return None
+
+
+def remember(userid, exists: bool):
+    """Caches whether a user ID exists.
+
+    Args:
+        userid (int | str): The user's unique ID.
+        exists (bool): Whether the user exists.
+    """
+    ttl = _ttl_seconds if exists else _negative_ttl_seconds
+    if ttl <= 0:
+        return
+
+    key = str(userid)
+
+    with _lock:
+        _cache[key] = (exists, time.monotonic() + ttl)
+        _cache.move_to_end(key)
+
+        while len(_cache) > MAX_SIZE:
+            _cache.popitem(last=False)
+
+
+def user_exists(db_conn, userid):
+    """Checks whether a user exists, querying the database only on a cache miss.
+
+    Args:
+        db_conn (Connection[Cursor]): The database connection object.
+        userid (int | str): The user's unique ID.
+
+    Returns:
+        bool: Whether the user exists.
+    """
+    exists = lookup(userid)
+
+    if exists is None:
+        exists = datatier.retrieve_one_row(db_conn, EXISTS_SQL, [userid]) != ()
+        remember(userid, exists)
+
+    return exists
+
+
+def invalidate(userid=None):
+    """Forgets what is cached about a user ID.
+
+    Args:
+        userid (int | str | None): The user's unique ID, or None to forget every
+            user. Defaults to None.
+    """
+    with _lock:
+        if userid is None:
+            _cache.clear()
+        else:
+            _cache.pop(str(userid), None)
+
+
+def configure(ttl_seconds: float, negative_ttl_seconds: float):
+    """Changes how long answers are cached. Entries already cached keep theirs.
+
+    Args:
+        ttl_seconds (float): How long to remember that a user exists, or 0 to
+            stop caching such answers.
+        negative_ttl_seconds (float): How long to remember that a user does not
+            exist, or 0 to stop caching such answers.
+    """
+    global _ttl_seconds, _negative_ttl_seconds
+
+    _ttl_seconds = ttl_seconds
+    _negative_ttl_seconds = negative_ttl_seconds
+
+
+def stats():
+    """Returns the cache's counters.
+
+    Returns:
+        dict: `hits`, `misses` and the current `size` of the cache.
+    """
+    with _lock:
+        return {"hits": _hits, "misses": _misses, "size": len(_cache)}
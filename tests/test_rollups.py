@@ -0,0 +1,37 @@
+"""Checks the SQL that keeps the monthly rollups.
+
+This file contains the following tests:
+
+    * test_merge_qualifies_updated_columns - the merge's updates name their table
+    * test_merge_qualifies_selected_columns - the merge's SELECT names its alias
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+from utils import rollups  # noqa: E402
+
+COLUMNS = ["total", "count", "smallest", "largest"]
+
+
+def test_merge_qualifies_updated_columns():
+    _, updates = rollups.MERGE_SQL.split("ON DUPLICATE KEY UPDATE")
+
+    # VALUES() names the inserted row's column, which is never ambiguous.
+    updates = re.sub(r"VALUES\(\w+\)", "", updates)
+
+    for column in COLUMNS:
+        bare = re.findall(r"(?<![.\w])" + column + r"\b", updates)
+        assert bare == [], column + " is not qualified"
+
+        assert "monthly_rollups." + column + " =" in updates
+
+
+def test_merge_qualifies_selected_columns():
+    select = rollups.MERGE_SQL.split("SELECT")[1].split("FROM")[0]
+
+    for column in ["userid", "yearmonth"] + COLUMNS:
+        assert "source." + column in select